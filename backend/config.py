@@ -20,6 +20,12 @@ class Settings(BaseSettings):
     # AI Provider Configuration
     AI_PROVIDER: str = "gemini"  # Options: "openai" or "gemini"
 
+    # Maximum concurrent AI requests (defaults to a per-provider limit)
+    AI_MAX_CONCURRENCY: Optional[int] = None
+
+    # Maximum AI requests per minute (defaults to a per-provider limit)
+    AI_REQUESTS_PER_MINUTE: Optional[int] = None
+
     # OpenAI Configuration (only needed if AI_PROVIDER=openai)
     OPENAI_API_KEY: Optional[str] = None
     OPENAI_MODEL: str = "gpt-4o-mini"
@@ -37,6 +43,11 @@ class Settings(BaseSettings):
     BACKEND_URL: str = "http://localhost:8000"
     ENVIRONMENT: str = "development"
 
+    # Send emails after responding with 202; needs one long-lived process (render.yaml).
+    # Serverless functions (Vercel sets VERCEL) may stop once the response is sent and
+    # spread status polls across instances, so there emails are sent before responding.
+    SEND_EMAIL_IN_BACKGROUND: bool = not os.environ.get("VERCEL")
+
     # Gmail API Scopes
     GMAIL_SCOPES: list = [
         "https://mail.google.com/",
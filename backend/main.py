@@ -1,49 +1,46 @@
 """Main FastAPI application for AI Email Assistant."""
+import asyncio
+import hashlib
 import logging
+import threading
+import time
+import uuid
 from contextlib import asynccontextmanager
-from typing import Optional, List, Dict, Any
-from fastapi import FastAPI, HTTPException, Request, Response, Depends, status
+from datetime import timezone
+from typing import AsyncIterator, Optional, List, Dict, Any, Tuple
+from fastapi import APIRouter, BackgroundTasks, FastAPI, HTTPException, Request, Response, Depends, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, RedirectResponse
-from pydantic import BaseModel
+from fastapi.responses import JSONResponse, RedirectResponse, StreamingResponse
+from starlette.middleware.base import BaseHTTPMiddleware
+from cachetools import TLRUCache, TTLCache
+import orjson
+from googleapiclient.errors import HttpError
 
 from config import settings
 from services.auth_service import auth_service
 from services.gmail_service import GmailService
-from services.ai_service import ai_service
+from services.ai_service import BATCH_SIZE, ai_service
+from schemas import ChatMessage, EmailReplyRequest, SendEmailRequest, DeleteEmailRequest
 
-# Configure logging
+# Configure logging (quieter in production)
 logging.basicConfig(
-    level=logging.INFO,
+    level=logging.WARNING if settings.ENVIRONMENT == "production" else logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
 
 
-# Pydantic models for request/response
-class ChatMessage(BaseModel):
-    """Chat message model."""
-    message: str
-    conversation_history: Optional[List[Dict[str, str]]] = []
-
-
-class EmailReplyRequest(BaseModel):
-    """Request model for generating email reply."""
-    email_id: str
-    custom_context: Optional[str] = None
-
+class ORJSONResponse(JSONResponse):
+    """
+    JSON response serialized with orjson.
 
-class SendEmailRequest(BaseModel):
-    """Request model for sending email."""
-    to: str
-    subject: str
-    body: str
-    thread_id: Optional[str] = None
+    Defined here because fastapi.responses.ORJSONResponse is deprecated.
+    """
 
+    media_type = "application/json"
 
-class DeleteEmailRequest(BaseModel):
-    """Request model for deleting email."""
-    email_id: str
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content)
 
 
 # Lifespan context manager
@@ -51,34 +48,123 @@ class DeleteEmailRequest(BaseModel):
 async def lifespan(app: FastAPI):
     """Application lifespan manager."""
     logger.info("Starting AI Email Assistant API")
-    logger.info(f"Environment: {settings.ENVIRONMENT}")
-    logger.info(f"Frontend URL: {settings.FRONTEND_URL}")
+    logger.info("Environment: %s", settings.ENVIRONMENT)
+    logger.info("Frontend URL: %s", settings.FRONTEND_URL)
+
+    # Refresh cached Google credentials before they expire
+    heartbeat = asyncio.create_task(auth_service.run_credentials_heartbeat())
+
     yield
+
+    heartbeat.cancel()
     logger.info("Shutting down AI Email Assistant API")
 
 
+# Short-lived cache of verified JWT payloads, keyed by token hash.
+# Only successful verifications are cached.
+JWT_CACHE_TTL_SECONDS = 30
+_jwt_cache: TTLCache = TTLCache(maxsize=10_000, ttl=JWT_CACHE_TTL_SECONDS)
+_jwt_cache_lock = threading.Lock()
+
+
+def verify_token_cached(token: str) -> Optional[Dict[str, Any]]:
+    """
+    Verify a JWT token, reusing recently verified payloads.
+
+    Args:
+        token: JWT token string
+
+    Returns:
+        Decoded token payload or None if invalid
+    """
+    key = hashlib.blake2b(token.encode(), digest_size=16).digest()
+
+    with _jwt_cache_lock:
+        payload = _jwt_cache.get(key)
+
+    # The cache TTL is fixed, so re-check expiry to never outlive the token
+    if payload is not None and payload.get("exp", 0) > time.time():
+        return payload
+
+    payload = auth_service.verify_jwt_token(token)
+    if payload:
+        with _jwt_cache_lock:
+            _jwt_cache[key] = payload
+
+    return payload
+
+
+# Paths that never require authentication
+PUBLIC_PATHS = frozenset({"/", "/health", "/auth/login", "/auth/callback", "/auth/logout"})
+
+
+def extract_token(request: Request) -> Optional[str]:
+    """
+    Extract the JWT token from cookies or the Authorization header.
+
+    Args:
+        request: Incoming request
+
+    Returns:
+        Token string or None if not provided
+    """
+    # Try to get token from cookie
+    token = request.cookies.get("auth_token")
+
+    # If not in cookie, try Authorization header
+    if not token:
+        auth_header = request.headers.get("Authorization")
+        if auth_header and auth_header.startswith("Bearer "):
+            token = auth_header.split(" ")[1]
+
+    return token
+
+
+class AuthMiddleware(BaseHTTPMiddleware):
+    """Verify the session token once per request and attach it to request.state."""
+
+    async def dispatch(self, request: Request, call_next):
+        request.state.user = None
+        request.state.has_token = False
+
+        if request.method != "OPTIONS" and request.url.path not in PUBLIC_PATHS:
+            token = extract_token(request)
+            if token:
+                request.state.has_token = True
+                request.state.user = verify_token_cached(token)
+
+        return await call_next(request)
+
+
 # Initialize FastAPI app
 app = FastAPI(
     title="AI Email Assistant API",
     description="Backend API for AI-powered Gmail assistant",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
+# Authenticate requests (registered before CORS so CORS stays outermost)
+app.add_middleware(AuthMiddleware)
+
 # Configure CORS
+# Starlette matches allow_origins literally, so Vercel previews need the regex
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=[settings.FRONTEND_URL, "http://localhost:3000", "https://*.vercel.app"],
+    allow_origins=list(dict.fromkeys([settings.FRONTEND_URL, "http://localhost:3000"])),
+    allow_origin_regex=r"^https://[a-z0-9-]+\.vercel\.app$",
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    max_age=600,
 )
 
 
 # Dependency to get current user from JWT token
 async def get_current_user(request: Request) -> Dict[str, Any]:
     """
-    Extract and verify JWT token from cookies or Authorization header.
+    Return the user payload verified by AuthMiddleware.
 
     Args:
         request: FastAPI request object
@@ -89,24 +175,14 @@ async def get_current_user(request: Request) -> Dict[str, Any]:
     Raises:
         HTTPException: If token is missing or invalid
     """
-    # Try to get token from cookie
-    token = request.cookies.get("auth_token")
-
-    # If not in cookie, try Authorization header
-    if not token:
-        auth_header = request.headers.get("Authorization")
-        if auth_header and auth_header.startswith("Bearer "):
-            token = auth_header.split(" ")[1]
-
-    if not token:
+    if not getattr(request.state, "has_token", False):
         logger.warning("No authentication token provided")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Not authenticated. Please log in."
         )
 
-    # Verify token
-    payload = auth_service.verify_jwt_token(token)
+    payload = request.state.user
     if not payload:
         logger.warning("Invalid or expired token")
         raise HTTPException(
@@ -117,6 +193,109 @@ async def get_current_user(request: Request) -> Dict[str, Any]:
     return payload
 
 
+# Routes that require an authenticated user. Handlers that also declare
+# Depends(get_current_user) get the same cached result for the request.
+protected = APIRouter(dependencies=[Depends(get_current_user)])
+
+
+# Gmail services keyed by access token hash; building one is expensive
+GMAIL_SERVICE_CACHE_TTL_SECONDS = 30 * 60
+
+
+def _gmail_service_ttu(key: bytes, gmail_service: GmailService, now: float) -> float:
+    """Keep a cached Gmail service until its access token expires, at most 30 minutes."""
+    expires = now + GMAIL_SERVICE_CACHE_TTL_SECONDS
+    expiry = gmail_service.credentials.expiry
+    if expiry is not None:
+        # google-auth stores expiry as naive UTC
+        expires = min(expires, expiry.replace(tzinfo=timezone.utc).timestamp())
+    return expires
+
+
+# Each GmailService holds its own parsed discovery document, about 400 KiB, and up to
+# MESSAGE_CACHE_SIZE parsed messages with capped bodies, so 200 services stay within
+# roughly 150 MB. Users past that rebuild theirs.
+GMAIL_SERVICE_CACHE_SIZE = 200
+_gmail_service_cache: TLRUCache = TLRUCache(
+    maxsize=GMAIL_SERVICE_CACHE_SIZE, ttu=_gmail_service_ttu, timer=time.time
+)
+
+
+async def get_gmail_service(user_data: Dict[str, Any]) -> GmailService:
+    """
+    Return a Gmail service for the current user, reusing a cached instance.
+
+    Tokens close to expiry are refreshed in the background before they are used.
+
+    Args:
+        user_data: User data from JWT token
+
+    Returns:
+        GmailService for the user's credentials
+
+    Raises:
+        HTTPException: If the session carries no access token
+    """
+    credentials_data = user_data.get("credentials") or {}
+    access_token = credentials_data.get("access_token")
+    if not access_token:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid or expired session. Please log in again."
+        )
+    key = hashlib.sha256(access_token.encode()).digest()
+
+    gmail_service = _gmail_service_cache.get(key)
+    if gmail_service is None:
+        credentials = auth_service.get_credentials_from_token_data(credentials_data)
+        gmail_service = GmailService(credentials)
+        _gmail_service_cache[key] = gmail_service
+
+    await auth_service.get_fresh_credentials(gmail_service.credentials)
+    return gmail_service
+
+
+async def attach_summaries(emails: List[Dict[str, Any]]) -> None:
+    """
+    Summarize emails in one AI request and store each result in email['ai_summary'].
+
+    Args:
+        emails: Emails to summarize (modified in place)
+    """
+    # List fetches carry only the snippet, so summarize that when there is no body
+    pairs = [(e.get('subject', ''), e.get('body') or e.get('snippet', '')) for e in emails]
+    summaries = await ai_service.summarize_emails(pairs)
+    for email, summary in zip(emails, summaries):
+        email['ai_summary'] = summary
+
+
+async def categorize_with_digest(emails: List[Dict[str, Any]]) -> Tuple[Dict[str, List[Dict[str, Any]]], str]:
+    """
+    Categorize and summarize emails and build the daily digest concurrently.
+
+    The digest only needs the email metadata, so it runs alongside categorization
+    instead of after it.
+
+    Args:
+        emails: Emails to process (summaries are added in place)
+
+    Returns:
+        Tuple of (categories, digest)
+    """
+    async def categorize() -> Dict[str, List[Dict[str, Any]]]:
+        categories = await ai_service.categorize_emails(emails)
+
+        # Summarize anything categorization didn't cover
+        missing = [e for e in emails if 'ai_summary' not in e]
+        if missing:
+            await attach_summaries(missing)
+
+        return categories
+
+    categories, digest = await asyncio.gather(categorize(), ai_service.generate_daily_digest(emails))
+    return categories, digest
+
+
 # Root endpoint
 @app.get("/")
 async def root():
@@ -153,7 +332,7 @@ async def login():
         return {"authorization_url": authorization_url}
 
     except Exception as e:
-        logger.error(f"Login error: {str(e)}")
+        logger.error("Login error: %s", e)
         raise HTTPException(status_code=500, detail="Failed to initiate login")
 
 
@@ -172,7 +351,7 @@ async def auth_callback(code: Optional[str] = None, error: Optional[str] = None,
     """
     try:
         if error:
-            logger.error(f"OAuth error: {error}")
+            logger.error("OAuth error: %s", error)
             return RedirectResponse(
                 url=f"{settings.FRONTEND_URL}/?error=access_denied"
             )
@@ -209,7 +388,7 @@ async def auth_callback(code: Optional[str] = None, error: Optional[str] = None,
         return response
 
     except Exception as e:
-        logger.error(f"Callback error: {str(e)}")
+        logger.error("Callback error: %s", e)
         return RedirectResponse(
             url=f"{settings.FRONTEND_URL}/?error=auth_failed"
         )
@@ -231,7 +410,7 @@ async def logout(response: Response):
     return {"message": "Logged out successfully"}
 
 
-@app.get("/auth/me")
+@protected.get("/auth/me")
 async def get_current_user_info(user_data: Dict[str, Any] = Depends(get_current_user)):
     """
     Get current authenticated user information.
@@ -252,9 +431,48 @@ async def get_current_user_info(user_data: Dict[str, Any] = Depends(get_current_
 # EMAIL ENDPOINTS
 # ============================================================================
 
-@app.get("/emails")
+def sse_event(event: str, data: Any) -> bytes:
+    """Encode a Server-Sent Event with a JSON payload."""
+    return b"event: " + event.encode() + b"\ndata: " + orjson.dumps(data) + b"\n\n"
+
+
+async def stream_summaries(emails: List[Dict[str, Any]]) -> AsyncIterator[bytes]:
+    """
+    Stream emails as Server-Sent Events, followed by their summaries as they complete.
+
+    Emails are summarized in batch-sized chunks concurrently, and each chunk's
+    summaries are sent as soon as it finishes.
+
+    Args:
+        emails: Emails to send and summarize
+
+    Yields:
+        An "emails" event, one "summary" event per email, then a "done" event
+    """
+    yield sse_event("emails", {"emails": emails})
+
+    async def summarize_chunk(chunk: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        await attach_summaries(chunk)
+        return chunk
+
+    chunks = [emails[i:i + BATCH_SIZE] for i in range(0, len(emails), BATCH_SIZE)]
+    tasks = [asyncio.create_task(summarize_chunk(chunk)) for chunk in chunks]
+    try:
+        for next_chunk in asyncio.as_completed(tasks):
+            for email in await next_chunk:
+                yield sse_event("summary", {"id": email.get("id"), "summary": email["ai_summary"]})
+    finally:
+        # Stop summarizing once the client disconnects
+        for task in tasks:
+            task.cancel()
+
+    yield sse_event("done", {})
+
+
+@protected.get("/emails")
 async def get_emails(
     limit: int = 5,
+    stream: bool = False,
     user_data: Dict[str, Any] = Depends(get_current_user)
 ):
     """
@@ -262,40 +480,42 @@ async def get_emails(
 
     Args:
         limit: Number of emails to fetch
+        stream: Send emails immediately and stream summaries as Server-Sent Events
         user_data: User data from JWT token
 
     Returns:
-        List of emails with AI summaries
+        List of emails with AI summaries, or an event stream when stream is set
     """
     try:
-        logger.info(f"Fetching {limit} emails")
+        logger.info("Fetching %s emails", limit)
 
-        # Get credentials and create Gmail service
-        credentials = auth_service.get_credentials_from_token_data(
-            user_data.get("credentials")
-        )
-        gmail_service = GmailService(credentials)
+        # Get the cached Gmail service for this user
+        gmail_service = await get_gmail_service(user_data)
 
-        # Fetch emails
-        emails = await gmail_service.fetch_emails(max_results=limit)
+        # Fetch emails with bodies; the cards show them and summaries are built from them
+        emails = await gmail_service.fetch_emails(max_results=limit, light=False)
 
-        # Generate AI summaries for each email
-        for email in emails:
-            summary = await ai_service.summarize_email(
-                email.get('body', ''),
-                email.get('subject', '')
+        if stream:
+            return StreamingResponse(
+                stream_summaries(emails),
+                media_type="text/event-stream",
+                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
             )
-            email['ai_summary'] = summary
 
-        logger.info(f"Successfully fetched and summarized {len(emails)} emails")
+        # Generate AI summaries for each email
+        await attach_summaries(emails)
+
+        logger.info("Successfully fetched and summarized %s emails", len(emails))
         return {"emails": emails}
 
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Error fetching emails: {str(e)}")
+        logger.error("Error fetching emails: %s", e)
         raise HTTPException(status_code=500, detail=f"Failed to fetch emails: {str(e)}")
 
 
-@app.post("/emails/reply/generate")
+@protected.post("/emails/reply/generate")
 async def generate_email_reply(
     request: EmailReplyRequest,
     user_data: Dict[str, Any] = Depends(get_current_user)
@@ -311,20 +531,18 @@ async def generate_email_reply(
         Generated reply text
     """
     try:
-        logger.info(f"Generating reply for email: {request.email_id}")
+        logger.info("Generating reply for email: %s", request.email_id)
 
-        # Get credentials and create Gmail service
-        credentials = auth_service.get_credentials_from_token_data(
-            user_data.get("credentials")
-        )
-        gmail_service = GmailService(credentials)
+        # Get the cached Gmail service for this user
+        gmail_service = await get_gmail_service(user_data)
 
         # Fetch the specific email
-        emails = await gmail_service.fetch_emails(max_results=20)
-        email = next((e for e in emails if e['id'] == request.email_id), None)
-
-        if not email:
-            raise HTTPException(status_code=404, detail="Email not found")
+        try:
+            email = await gmail_service.get_email_by_id(request.email_id)
+        except HttpError as error:
+            if error.resp.status == 404:
+                raise HTTPException(status_code=404, detail="Email not found")
+            raise
 
         # Generate reply
         reply = await ai_service.generate_reply(
@@ -343,55 +561,127 @@ async def generate_email_reply(
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error generating reply: {str(e)}")
+        logger.error("Error generating reply: %s", e)
         raise HTTPException(status_code=500, detail=f"Failed to generate reply: {str(e)}")
 
 
-@app.post("/emails/send")
+# Outcome of queued emails keyed by client_id, kept long enough for the client to poll
+SEND_STATUS_TTL_SECONDS = 10 * 60
+_send_status: TTLCache = TTLCache(maxsize=10_000, ttl=SEND_STATUS_TTL_SECONDS)
+
+
+def _user_email(user_data: Dict[str, Any]) -> Optional[str]:
+    """Return the signed-in user's email address from the JWT payload."""
+    return (user_data.get("user_info") or {}).get("email")
+
+
+async def deliver_email(gmail_service: GmailService, request: SendEmailRequest, client_id: str) -> None:
+    """
+    Send a queued email and record the outcome for GET /emails/send/{client_id}.
+
+    Args:
+        gmail_service: Gmail service for the sending user
+        request: Send email request
+        client_id: ID returned to the client when the email was queued
+    """
+    send_status = _send_status.get(client_id, {})
+    try:
+        result = await gmail_service.send_email(
+            to=request.to,
+            subject=request.subject,
+            body=request.body,
+            thread_id=request.thread_id
+        )
+        logger.info("Email %s sent successfully: %s", client_id, result['id'])
+        send_status.update(status="sent", message_id=result['id'])
+
+    except Exception as e:
+        logger.error("Error sending email %s: %s", client_id, e)
+        send_status.update(status="failed", error=str(e))
+
+
+@protected.post("/emails/send", status_code=status.HTTP_202_ACCEPTED)
 async def send_email(
     request: SendEmailRequest,
+    background_tasks: BackgroundTasks,
+    response: Response,
     user_data: Dict[str, Any] = Depends(get_current_user)
 ):
     """
-    Send an email via Gmail.
+    Queue an email to be sent via Gmail after the response is returned.
+
+    When SEND_EMAIL_IN_BACKGROUND is off the email is sent before responding
+    with 200 instead.
 
     Args:
         request: Send email request
+        background_tasks: Runs the send once the response is sent
+        response: Response whose status is set for synchronous sends
         user_data: User data from JWT token
 
     Returns:
-        Sent email details
+        Queued or sent status and an ID for the email
     """
     try:
-        logger.info(f"Sending email to: {request.to}")
+        logger.info("Queueing email to: %s", request.to)
 
-        # Get credentials and create Gmail service
-        credentials = auth_service.get_credentials_from_token_data(
-            user_data.get("credentials")
-        )
-        gmail_service = GmailService(credentials)
+        # Get the cached Gmail service for this user
+        gmail_service = await get_gmail_service(user_data)
 
-        # Send email
-        result = await gmail_service.send_email(
-            to=request.to,
-            subject=request.subject,
-            body=request.body,
-            thread_id=request.thread_id
-        )
+        client_id = uuid.uuid4().hex
+
+        if not settings.SEND_EMAIL_IN_BACKGROUND:
+            result = await gmail_service.send_email(
+                to=request.to,
+                subject=request.subject,
+                body=request.body,
+                thread_id=request.thread_id
+            )
+            logger.info("Email %s sent successfully: %s", client_id, result['id'])
+            response.status_code = status.HTTP_200_OK
+            return {
+                "message": "Email sent successfully",
+                "status": "sent",
+                "client_id": client_id,
+                "message_id": result['id']
+            }
+
+        _send_status[client_id] = {"owner": _user_email(user_data), "status": "queued"}
+        background_tasks.add_task(deliver_email, gmail_service, request, client_id)
 
-        logger.info(f"Email sent successfully: {result['id']}")
         return {
-            "message": "Email sent successfully",
-            "email_id": result['id'],
-            "thread_id": result.get('thread_id')
+            "message": "Email queued for sending",
+            "status": "queued",
+            "client_id": client_id
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Error sending email: {str(e)}")
+        logger.error("Error queueing email: %s", e)
         raise HTTPException(status_code=500, detail=f"Failed to send email: {str(e)}")
 
 
-@app.post("/emails/delete")
+@protected.get("/emails/send/{client_id}")
+async def get_send_status(client_id: str, user_data: Dict[str, Any] = Depends(get_current_user)):
+    """
+    Report whether a queued email has been sent.
+
+    Args:
+        client_id: ID returned when the email was queued
+        user_data: User data from JWT token
+
+    Returns:
+        Status "queued", "sent" or "failed", with the error for failed sends
+    """
+    send_status = _send_status.get(client_id)
+    if send_status is None or send_status["owner"] != _user_email(user_data):
+        raise HTTPException(status_code=404, detail="Unknown or expired email ID")
+
+    return {"client_id": client_id, **{k: v for k, v in send_status.items() if k != "owner"}}
+
+
+@protected.post("/emails/delete")
 async def delete_email(
     request: DeleteEmailRequest,
     user_data: Dict[str, Any] = Depends(get_current_user)
@@ -407,22 +697,21 @@ async def delete_email(
         Success message
     """
     try:
-        logger.info(f"Deleting email: {request.email_id}")
+        logger.info("Deleting email: %s", request.email_id)
 
-        # Get credentials and create Gmail service
-        credentials = auth_service.get_credentials_from_token_data(
-            user_data.get("credentials")
-        )
-        gmail_service = GmailService(credentials)
+        # Get the cached Gmail service for this user
+        gmail_service = await get_gmail_service(user_data)
 
         # Delete email
         await gmail_service.delete_email(request.email_id)
 
-        logger.info(f"Email deleted successfully: {request.email_id}")
+        logger.info("Email deleted successfully: %s", request.email_id)
         return {"message": "Email deleted successfully"}
 
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Error deleting email: {str(e)}")
+        logger.error("Error deleting email: %s", e)
         raise HTTPException(status_code=500, detail=f"Failed to delete email: {str(e)}")
 
 
@@ -430,7 +719,7 @@ async def delete_email(
 # CHAT / AI ENDPOINTS
 # ============================================================================
 
-@app.post("/chat")
+@protected.post("/chat")
 async def chat(
     request: ChatMessage,
     user_data: Dict[str, Any] = Depends(get_current_user)
@@ -446,20 +735,17 @@ async def chat(
         Chat response with action results
     """
     try:
-        logger.info(f"Processing chat message: {request.message[:50]}...")
+        logger.info("Processing chat message: %s...", request.message[:50])
 
         # Classify intent
         intent_result = await ai_service.classify_intent(request.message)
         intent = intent_result.get("intent")
         params = intent_result.get("parameters", {})
 
-        logger.info(f"Detected intent: {intent}")
+        logger.info("Detected intent: %s", intent)
 
-        # Get credentials
-        credentials = auth_service.get_credentials_from_token_data(
-            user_data.get("credentials")
-        )
-        gmail_service = GmailService(credentials)
+        # Get the cached Gmail service for this user
+        gmail_service = await get_gmail_service(user_data)
 
         response_data = {
             "intent": intent,
@@ -470,38 +756,19 @@ async def chat(
         # Handle different intents
         if intent == "READ_EMAILS":
             limit = params.get("limit") or 5
-            emails = await gmail_service.fetch_emails(max_results=limit)
+            emails = await gmail_service.fetch_emails(max_results=limit, light=False)
 
             # Generate summaries
-            for email in emails:
-                summary = await ai_service.summarize_email(
-                    email.get('body', ''),
-                    email.get('subject', '')
-                )
-                email['ai_summary'] = summary
+            await attach_summaries(emails)
 
             response_data["emails"] = emails
             response_data["message"] = f"Here are your last {len(emails)} emails:"
 
         elif intent == "CATEGORIZE":
             limit = params.get("limit") or 20
-            emails = await gmail_service.fetch_emails(max_results=limit)
-
-            # Categorize emails
-            categories = await ai_service.categorize_emails(emails)
+            emails = await gmail_service.fetch_emails(max_results=limit, light=False)
 
-            # Generate summaries for categorized emails
-            for category_emails in categories.values():
-                for email in category_emails:
-                    if 'ai_summary' not in email:
-                        summary = await ai_service.summarize_email(
-                            email.get('body', ''),
-                            email.get('subject', '')
-                        )
-                        email['ai_summary'] = summary
-
-            # Generate daily digest
-            digest = await ai_service.generate_daily_digest(emails)
+            categories, digest = await categorize_with_digest(emails)
 
             response_data["categories"] = categories
             response_data["digest"] = digest
@@ -513,7 +780,7 @@ async def chat(
             subject_keyword = params.get("subject_keyword")
             email_index = params.get("email_index")
             
-            logger.info(f"DELETE_EMAIL params: sender={sender}, subject={subject_keyword}, index={email_index}")
+            logger.info("DELETE_EMAIL params: sender=%s, subject=%s, index=%s", sender, subject_keyword, email_index)
             
             email_to_delete = None
             
@@ -532,7 +799,7 @@ async def chat(
             # Option 2: Delete by sender (e.g., "delete email from John")
             if not email_to_delete and sender:
                 query = f"from:{sender}"
-                logger.info(f"Searching for emails with query: {query}")
+                logger.info("Searching for emails with query: %s", query)
                 found_emails = await gmail_service.fetch_emails_with_query(query, max_results=1)
                 if found_emails:
                     email_to_delete = found_emails[0]
@@ -540,7 +807,7 @@ async def chat(
             # Option 3: Delete by subject keyword (e.g., "delete email about meeting")
             if not email_to_delete and subject_keyword:
                 query = f"subject:{subject_keyword}"
-                logger.info(f"Searching for emails with query: {query}")
+                logger.info("Searching for emails with query: %s", query)
                 found_emails = await gmail_service.fetch_emails_with_query(query, max_results=1)
                 if found_emails:
                     email_to_delete = found_emails[0]
@@ -552,7 +819,7 @@ async def chat(
                 email_sender = email_to_delete.get("sender_name") or email_to_delete.get("sender_email", "Unknown")
                 
                 await gmail_service.delete_email(email_id)
-                logger.info(f"Successfully deleted email: {email_subject} from {email_sender}")
+                logger.info("Successfully deleted email: %s from %s", email_subject, email_sender)
                 
                 response_data["message"] = f"✅ Successfully deleted email from **{email_sender}**: \"{email_subject}\""
                 response_data["deleted_email"] = {
@@ -587,12 +854,14 @@ Just ask me naturally, and I'll help you manage your inbox!"""
 
         return response_data
 
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Error processing chat: {str(e)}")
+        logger.error("Error processing chat: %s", e)
         raise HTTPException(status_code=500, detail=f"Failed to process message: {str(e)}")
 
 
-@app.post("/chat/categorize")
+@protected.post("/chat/categorize")
 async def categorize_emails(
     limit: int = 20,
     user_data: Dict[str, Any] = Depends(get_current_user)
@@ -608,48 +877,37 @@ async def categorize_emails(
         Categorized emails and digest
     """
     try:
-        logger.info(f"Categorizing {limit} emails")
-
-        # Get credentials and create Gmail service
-        credentials = auth_service.get_credentials_from_token_data(
-            user_data.get("credentials")
-        )
-        gmail_service = GmailService(credentials)
+        logger.info("Categorizing %s emails", limit)
 
-        # Fetch emails
-        emails = await gmail_service.fetch_emails(max_results=limit)
+        # Get the cached Gmail service for this user
+        gmail_service = await get_gmail_service(user_data)
 
-        # Categorize
-        categories = await ai_service.categorize_emails(emails)
-
-        # Generate summaries
-        for category_emails in categories.values():
-            for email in category_emails:
-                summary = await ai_service.summarize_email(
-                    email.get('body', ''),
-                    email.get('subject', '')
-                )
-                email['ai_summary'] = summary
+        # Fetch emails with bodies for the cards and summaries
+        emails = await gmail_service.fetch_emails(max_results=limit, light=False)
 
-        # Generate digest
-        digest = await ai_service.generate_daily_digest(emails)
+        categories, digest = await categorize_with_digest(emails)
 
         return {
             "categories": categories,
             "digest": digest
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Error categorizing emails: {str(e)}")
+        logger.error("Error categorizing emails: %s", e)
         raise HTTPException(status_code=500, detail=f"Failed to categorize emails: {str(e)}")
 
 
+app.include_router(protected)
+
+
 # Error handlers
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request: Request, exc: HTTPException):
     """Handle HTTP exceptions."""
-    logger.error(f"HTTP {exc.status_code}: {exc.detail}")
-    return JSONResponse(
+    logger.error("HTTP %s: %s", exc.status_code, exc.detail)
+    return ORJSONResponse(
         status_code=exc.status_code,
         content={"detail": exc.detail}
     )
@@ -658,8 +916,8 @@ async def http_exception_handler(request: Request, exc: HTTPException):
 @app.exception_handler(Exception)
 async def general_exception_handler(request: Request, exc: Exception):
     """Handle general exceptions."""
-    logger.error(f"Unhandled exception: {str(exc)}", exc_info=True)
-    return JSONResponse(
+    logger.error("Unhandled exception: %s", exc, exc_info=True)
+    return ORJSONResponse(
         status_code=500,
         content={"detail": "An unexpected error occurred. Please try again."}
     )
@@ -667,4 +925,4 @@ async def general_exception_handler(request: Request, exc: Exception):
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000, log_level="info")
+    uvicorn.run("main:app", host="0.0.0.0", port=8000, log_level="info")
@@ -0,0 +1,28 @@
+"""Pydantic models for API requests and responses."""
+from typing import Optional, List, Dict
+from pydantic import BaseModel
+
+
+class ChatMessage(BaseModel):
+    """Chat message model."""
+    message: str
+    conversation_history: Optional[List[Dict[str, str]]] = []
+
+
+class EmailReplyRequest(BaseModel):
+    """Request model for generating email reply."""
+    email_id: str
+    custom_context: Optional[str] = None
+
+
+class SendEmailRequest(BaseModel):
+    """Request model for sending email."""
+    to: str
+    subject: str
+    body: str
+    thread_id: Optional[str] = None
+
+
+class DeleteEmailRequest(BaseModel):
+    """Request model for deleting email."""
+    email_id: str
@@ -4,29 +4,228 @@ Supports multiple AI providers:
 - OpenAI (GPT-4o-mini) - Requires paid API key
 - Google Gemini (gemini-pro) - FREE with API key from Google AI Studio
 """
+import hashlib
 import logging
-from typing import List, Dict, Any, Optional
+import re
+from collections import defaultdict
+from typing import List, Dict, Any, Optional, Tuple
 from abc import ABC, abstractmethod
-import json
+
+from aiolimiter import AsyncLimiter
+from cachetools import TTLCache
+import orjson
 
 from config import settings
 
 logger = logging.getLogger(__name__)
 
+# Returned in place of a summary when the AI provider fails
+SUMMARY_UNAVAILABLE = "Summary unavailable (AI service busy)"
+
+# Categories returned by categorize_emails, in response order
+EMAIL_CATEGORIES = ("Work", "Personal", "Promotions", "Urgent")
+
+# Body characters sent when summarizing a single email
+SUMMARY_BODY_CHARS = 2000
+
+# Body characters sent per email when summarizing in a batch
+BATCH_BODY_CHARS = 1500
+
+# Emails packed into one batch summary request, to stay within max_tokens
+BATCH_SIZE = 8
+
+# Summary cache settings
+SUMMARY_CACHE_SIZE = 5000
+SUMMARY_CACHE_TTL_SECONDS = 24 * 3600
+
+# Intent cache settings
+INTENT_CACHE_SIZE = 1024
+INTENT_CACHE_TTL_SECONDS = 600
+
+# Lexical intent matches that skip the AI call; anything ambiguous goes to the model
+READ_RE = re.compile(r'\b(e?mails?|inbox|messages)\b', re.I)
+DIGEST_RE = re.compile(r'\b(digest|summar\w*|categor\w*|overview)\b', re.I)
+AMBIGUOUS_RE = re.compile(
+    r'\b(and|then|but|not|reply|respond|answer|send|write|draft|forward|delete|remove|trash|'
+    r'from|about|regarding|subject|work|personal|urgent|promotions?)\b'
+    r'|\b(e?mail|message)\s*#?\d'
+    # Time windows ("last 3 days", "since 2 weeks ago") are not email counts
+    r'|\b(hours?|days?|weeks?|months?|years?|since|past|ago)\b'
+    r'|\blast\s+\d+\s+(?!(e?mails?|messages)\b)',
+    re.I
+)
+# Only a number right before the noun, or before recency words and the noun, is an email count
+LIMIT_RE = re.compile(
+    r'\b(\d{1,3})\s+(?:(?:latest|newest|most|recent)\s+){0,2}(?:e?mails?|messages)\b',
+    re.I
+)
+# Questions ask about emails rather than for them
+QUESTION_RE = re.compile(r'\?|^\s*(what|how|why|is|are|do|does|can|could|who|when|where|which)\b', re.I)
+# A read command needs a verb asking for the emails
+READ_VERB_RE = re.compile(r'\b(show|list|read|check|get|give|fetch|display)\b', re.I)
+FAST_PATH_CONFIDENCE = 0.9
+FAST_PATH_MAX_LIMIT = 50
+
+# A response wrapped in a markdown code block, optionally tagged json
+_FENCE_RE = re.compile(r'^\s*```(?:json)?\s*(.*?)\s*```\s*$', re.S | re.I)
+
+
+def _parse_json(result_text: str) -> Any:
+    """Parse a JSON response from the model, removing a markdown code block if present."""
+    match = _FENCE_RE.match(result_text)
+    return orjson.loads(match.group(1) if match else result_text)
+
+
+def _summary_key(subject: str, body: str) -> bytes:
+    """Build a summary cache key from the part of the email the model sees."""
+    return hashlib.blake2b(f"{subject}\0{body[:SUMMARY_BODY_CHARS]}".encode(), digest_size=16).digest()
+
+
+# Prompt templates, filled in with str.format
+_SUMMARY_SYSTEM = "You are a helpful email assistant that creates concise, accurate summaries."
+
+_SUMMARY_USER = """Summarize the following email in 1-2 concise sentences. Focus on the main point and any action items.
+
+Subject: {subject}
+
+Email Content:
+{body}
+
+Provide only the summary, no additional commentary."""
+
+_BATCH_SUMMARY_SYSTEM = "You are a helpful email assistant that creates concise, accurate summaries. Always respond with valid JSON only."
+
+_BATCH_SUMMARY_USER = """Summarize each of the following emails in 1-2 concise sentences. Focus on the main point and any action items.
+
+Emails:
+{emails_text}
+
+Respond with a JSON object where keys are the email numbers and values are the summaries.
+Example: {{"0": "Summary of the first email.", "1": "Summary of the second email."}}
+
+Respond ONLY with the JSON object, no other text."""
+
+_REPLY_SYSTEM = "You are a professional email assistant that writes clear, appropriate responses."
+
+_REPLY_USER = """Generate a professional, context-aware reply to the following email. The reply should be:
+- Polite and professional
+- Addressing the main points raised
+- Concise but complete
+- Ready to send without modification
+
+Original Email:
+From: {sender}
+Subject: {subject}
+
+{body}
+{context_section}
+
+Generate only the email body (no subject line, no "Dear X" unless natural, just the message content)."""
+
+_INTENT_SYSTEM = "You are an intent classification system. Always respond with valid JSON only."
+
+_INTENT_USER = """Analyze the following user message and determine the intent and extract relevant parameters.
+
+User Message: "{user_message}"
+
+Classify the intent as one of:
+- READ_EMAILS: User wants to see/read emails
+- GENERATE_REPLY: User wants to reply to an email
+- SEND_EMAIL: User wants to send a new email or confirm sending a reply
+- DELETE_EMAIL: User wants to delete an email
+- CATEGORIZE: User wants emails categorized or a daily digest
+- GENERAL_CHAT: General conversation or unclear intent
+
+Also extract these parameters if present:
+- limit: Number of emails (integer)
+- sender: Specific sender name or email
+- subject_keyword: Subject line keyword
+- email_index: Reference to a previously shown email (e.g., "email 2", "the first one")
+- category: Category mentioned (work, personal, urgent, promotions)
+- custom_message: Any custom message content the user wants to include
+
+Respond ONLY with a JSON object in this exact format:
+{{
+  "intent": "INTENT_NAME",
+  "parameters": {{
+    "limit": number or null,
+    "sender": "string or null",
+    "subject_keyword": "string or null",
+    "email_index": number or null,
+    "category": "string or null",
+    "custom_message": "string or null"
+  }},
+  "confidence": 0.0 to 1.0
+}}"""
+
+_CATEGORIZE_SYSTEM = "You are an email categorization system. Always respond with valid JSON only."
+
+_CATEGORIZE_USER = """Categorize these emails into the following categories: Work, Personal, Promotions, Urgent.
+An email can belong to multiple categories if appropriate.
+Also summarize each email in 1 concise sentence, focusing on the main point and any action items.
+
+Emails:
+{emails_text}
+
+Respond with a JSON object where keys are email indices (0, 1, 2...) and values are objects with the categories and the summary.
+Example: {{"0": {{"categories": ["Work", "Urgent"], "summary": "..."}}, "1": {{"categories": ["Personal"], "summary": "..."}}}}
+
+Respond ONLY with the JSON object, no other text."""
+
+_DIGEST_SYSTEM = "You are a helpful email assistant creating daily digests."
+
+_DIGEST_USER = """Create a daily email digest summary. Include:
+
+1. A brief overview of the day's emails
+2. Key emails that require attention
+3. Suggested actions or follow-ups
+4. Any urgent or time-sensitive items
+
+Emails:
+{emails_text}
+
+Format the digest in a clear, organized manner with bullet points and sections."""
+
 
 class AIProvider(ABC):
     """Abstract base class for AI providers."""
 
+    # Default number of concurrent requests, overridable with AI_MAX_CONCURRENCY
+    MAX_CONCURRENCY = 8
+
+    # Default request rate per minute, overridable with AI_REQUESTS_PER_MINUTE
+    REQUESTS_PER_MINUTE = 500
+
+    # Bound for the per-provider request option caches
+    OPTION_CACHE_SIZE = 64
+
     @abstractmethod
     async def generate_text(self, system_prompt: str, user_prompt: str, temperature: float = 0.5, max_tokens: int = 500) -> str:
         """Generate text using the AI provider."""
         pass
 
 
-class OpenAIProvider(AIProvider):
+class ChatCompletionsProvider(AIProvider):
+    """Base for providers with an OpenAI-style chat completions API."""
+
+    def __init__(self):
+        self._system_messages: Dict[str, Dict[str, str]] = {}
+
+    def _messages(self, system_prompt: str, user_prompt: str) -> List[Dict[str, str]]:
+        """Build the chat messages, reusing the message for each fixed system prompt."""
+        system_message = self._system_messages.get(system_prompt)
+        if system_message is None:
+            system_message = {"role": "system", "content": system_prompt}
+            if len(self._system_messages) < self.OPTION_CACHE_SIZE:
+                self._system_messages[system_prompt] = system_message
+        return [system_message, {"role": "user", "content": user_prompt}]
+
+
+class OpenAIProvider(ChatCompletionsProvider):
     """OpenAI GPT provider."""
 
     def __init__(self, api_key: str, model: str):
+        super().__init__()
         from openai import AsyncOpenAI
         self.client = AsyncOpenAI(api_key=api_key)
         self.model = model
@@ -36,10 +235,7 @@ class OpenAIProvider(AIProvider):
         try:
             response = await self.client.chat.completions.create(
                 model=self.model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
+                messages=self._messages(system_prompt, user_prompt),
                 temperature=temperature,
                 max_tokens=max_tokens
             )
@@ -59,12 +255,27 @@ class GeminiProvider(AIProvider):
     MAX_RETRIES = 3
     BASE_DELAY = 2  # seconds
 
+    # Free tier has a low request rate limit
+    MAX_CONCURRENCY = 4
+    REQUESTS_PER_MINUTE = 30
+
     def __init__(self, api_key: str, model: str):
         import google.generativeai as genai
         genai.configure(api_key=api_key)
         self.model = genai.GenerativeModel(model)
+        self._configs: Dict[Tuple[float, int], Dict[str, Any]] = {}
         logger.info(f"Gemini provider initialized with model: {model}")
 
+    def _generation_config(self, temperature: float, max_tokens: int) -> Dict[str, Any]:
+        """Return the generation config for these settings, reused across calls."""
+        key = (temperature, max_tokens)
+        config = self._configs.get(key)
+        if config is None:
+            config = {"temperature": temperature, "max_output_tokens": max_tokens}
+            if len(self._configs) < self.OPTION_CACHE_SIZE:
+                self._configs[key] = config
+        return config
+
     async def generate_text(self, system_prompt: str, user_prompt: str, temperature: float = 0.5, max_tokens: int = 500) -> str:
         """
         Generate text using the Gemini API with robust retry logic for rate limits.
@@ -73,10 +284,7 @@ class GeminiProvider(AIProvider):
         full_prompt = f"{system_prompt}\n\n{user_prompt}"
 
         # Configure generation
-        generation_config = {
-            "temperature": temperature,
-            "max_output_tokens": max_tokens,
-        }
+        generation_config = self._generation_config(temperature, max_tokens)
 
         retries = 0
         last_error = None
@@ -116,10 +324,14 @@ class GeminiProvider(AIProvider):
         raise Exception("Unknown error in Gemini provider")
 
 
-class GroqProvider(AIProvider):
+class GroqProvider(ChatCompletionsProvider):
     """Groq Cloud provider (FREE, ultra-fast!)."""
 
+    MAX_CONCURRENCY = 16
+    REQUESTS_PER_MINUTE = 600
+
     def __init__(self, api_key: str, model: str):
+        super().__init__()
         from groq import AsyncGroq
         self.client = AsyncGroq(api_key=api_key)
         self.model = model
@@ -129,10 +341,7 @@ class GroqProvider(AIProvider):
         try:
             response = await self.client.chat.completions.create(
                 model=self.model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
+                messages=self._messages(system_prompt, user_prompt),
                 temperature=temperature,
                 max_tokens=max_tokens
             )
@@ -170,6 +379,25 @@ class AIService:
         else:
             raise ValueError(f"Unknown AI_PROVIDER: {provider_name}. Use 'openai', 'gemini', or 'groq'")
 
+        # Caps provider requests in flight, e.g. when summaries are fanned out with asyncio.gather
+        max_concurrency = settings.AI_MAX_CONCURRENCY or self.provider.MAX_CONCURRENCY
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+        # Paces requests under the provider's rate limit instead of retrying after a 429
+        requests_per_minute = settings.AI_REQUESTS_PER_MINUTE or self.provider.REQUESTS_PER_MINUTE
+        self._limiter = AsyncLimiter(requests_per_minute, time_period=60)
+
+        # Summaries keyed by content hash, so re-fetched emails skip the AI call
+        self._summary_cache = TTLCache(maxsize=SUMMARY_CACHE_SIZE, ttl=SUMMARY_CACHE_TTL_SECONDS)
+
+        # Intent results keyed by normalized message, so repeated commands skip the AI call
+        self._intent_cache = TTLCache(maxsize=INTENT_CACHE_SIZE, ttl=INTENT_CACHE_TTL_SECONDS)
+
+    async def _generate(self, system_prompt: str, user_prompt: str, temperature: float = 0.5, max_tokens: int = 500) -> str:
+        """Generate text with the provider, bounded by the concurrency and rate limits."""
+        async with self._semaphore, self._limiter:
+            return await self.provider.generate_text(system_prompt, user_prompt, temperature=temperature, max_tokens=max_tokens)
+
     async def summarize_email(self, email_content: str, subject: str) -> str:
         """
         Generate a concise summary of an email.
@@ -181,26 +409,101 @@ class AIService:
         Returns:
             AI-generated summary string
         """
+        key = _summary_key(subject, email_content)
+        cached = self._summary_cache.get(key)
+        if cached is not None:
+            return cached
+
         try:
             # logger.info("Generating email summary") # Reduce log noise
 
-            system_prompt = "You are a helpful email assistant that creates concise, accurate summaries."
+            system_prompt = _SUMMARY_SYSTEM
+            user_prompt = _SUMMARY_USER.format(subject=subject, body=email_content[:SUMMARY_BODY_CHARS])
 
-            user_prompt = f"""Summarize the following email in 1-2 concise sentences. Focus on the main point and any action items.
+            summary = await self._generate(system_prompt, user_prompt, temperature=0.3, max_tokens=150)
+            self._summary_cache[key] = summary
+            return summary
 
-Subject: {subject}
+        except Exception as e:
+            logger.error(f"Error generating email summary: {str(e)}")
+            return SUMMARY_UNAVAILABLE
 
-Email Content:
-{email_content[:2000]}
+    async def summarize_emails(self, emails: List[Tuple[str, str]]) -> List[str]:
+        """
+        Summarize several emails with a single AI request.
 
-Provide only the summary, no additional commentary."""
+        Args:
+            emails: List of (subject, body) pairs
 
-            summary = await self.provider.generate_text(system_prompt, user_prompt, temperature=0.3, max_tokens=150)
-            return summary
+        Returns:
+            Summaries in the same order as the input
+        """
+        results = [self._summary_cache.get(_summary_key(subject, body)) for subject, body in emails]
+        pending = [idx for idx, summary in enumerate(results) if summary is None]
+
+        if not pending:
+            return results
+
+        # Summarize pending emails in chunks, one request per chunk, concurrently
+        chunks = [pending[i:i + BATCH_SIZE] for i in range(0, len(pending), BATCH_SIZE)]
+        chunk_summaries = await asyncio.gather(*(self._summarize_chunk(emails, chunk) for chunk in chunks))
+        summaries = {}
+        for chunk_result in chunk_summaries:
+            summaries.update(chunk_result)
+
+        missing = []
+        for idx in pending:
+            summary = summaries.get(str(idx))
+            # The model may answer with a number, object or blank string; only cache real text
+            if isinstance(summary, str) and summary.strip():
+                self._summary_cache[_summary_key(*emails[idx])] = summary
+                results[idx] = summary
+            else:
+                missing.append(idx)
+
+        # Summarize anything the batch missed one by one, concurrently
+        if missing:
+            fallback = await asyncio.gather(
+                *(self.summarize_email(emails[idx][1], emails[idx][0]) for idx in missing),
+                return_exceptions=True
+            )
+            for idx, summary in zip(missing, fallback):
+                results[idx] = summary if isinstance(summary, str) else SUMMARY_UNAVAILABLE
+
+        return results
+
+    async def _summarize_chunk(self, emails: List[Tuple[str, str]], indices: List[int]) -> Dict[str, str]:
+        """
+        Summarize a chunk of emails with a single AI request.
+
+        Args:
+            emails: List of (subject, body) pairs
+            indices: Positions in emails to summarize
+
+        Returns:
+            Summaries keyed by the string position, empty if the request fails
+        """
+        try:
+            email_blocks = []
+            for idx in indices:
+                subject, body = emails[idx]
+                email_blocks.append(f"{idx}: Subject: {subject}\nEmail Content:\n{body[:BATCH_BODY_CHARS]}")
+
+            emails_text = "\n---\n".join(email_blocks)
+
+            system_prompt = _BATCH_SUMMARY_SYSTEM
+            user_prompt = _BATCH_SUMMARY_USER.format(emails_text=emails_text)
+
+            result_text = await self._generate(
+                system_prompt, user_prompt, temperature=0.3, max_tokens=100 * len(indices) + 100
+            )
+
+            summaries = _parse_json(result_text)
+            return summaries if isinstance(summaries, dict) else {}
 
         except Exception as e:
-            logger.error(f"Error generating email summary: {str(e)}")
-            return "Summary unavailable (AI service busy)"
+            logger.error(f"Error generating batch email summaries: {str(e)}")
+            return {}
 
     async def generate_reply(self, email_content: str, subject: str, sender: str, context: Optional[str] = None) -> str:
         """
@@ -220,24 +523,10 @@ Provide only the summary, no additional commentary."""
 
             context_section = f"\n\nAdditional Context: {context}" if context else ""
 
-            system_prompt = "You are a professional email assistant that writes clear, appropriate responses."
-
-            user_prompt = f"""Generate a professional, context-aware reply to the following email. The reply should be:
-- Polite and professional
-- Addressing the main points raised
-- Concise but complete
-- Ready to send without modification
+            system_prompt = _REPLY_SYSTEM
+            user_prompt = _REPLY_USER.format(sender=sender, subject=subject, body=email_content[:1500], context_section=context_section)
 
-Original Email:
-From: {sender}
-Subject: {subject}
-
-{email_content[:1500]}
-{context_section}
-
-Generate only the email body (no subject line, no "Dear X" unless natural, just the message content)."""
-
-            reply = await self.provider.generate_text(system_prompt, user_prompt, temperature=0.7, max_tokens=400)
+            reply = await self._generate(system_prompt, user_prompt, temperature=0.7, max_tokens=400)
             logger.info("Email reply generated successfully")
             return reply
 
@@ -245,66 +534,81 @@ Generate only the email body (no subject line, no "Dear X" unless natural, just
             logger.error(f"Error generating email reply: {str(e)}")
             return "I apologize, but I'm currently unable to generate a reply due to high demand. Please try again in a moment."
 
-    async def classify_intent(self, user_message: str) -> Dict[str, Any]:
+    @staticmethod
+    def _match_intent(user_message: str) -> Optional[Dict[str, Any]]:
         """
-        Classify user's intent and extract parameters using NLP.
+        Classify plain read and digest commands without the AI provider.
 
         Args:
             user_message: User's natural language command
 
         Returns:
-            Dictionary with intent and extracted parameters
+            Intent result in the classify_intent format, or None if the message is ambiguous
         """
-        try:
-            logger.info(f"Classifying intent for message: {user_message[:50]}...")
+        if AMBIGUOUS_RE.search(user_message) or QUESTION_RE.search(user_message):
+            return None
+
+        # Any number other than the email count may change the meaning
+        limit = LIMIT_RE.search(user_message)
+        rest = user_message[:limit.start()] + user_message[limit.end():] if limit else user_message
+        if any(char.isdigit() for char in rest):
+            return None
+
+        # A digest of emails mentions both, so check it first
+        if DIGEST_RE.search(user_message):
+            intent = "CATEGORIZE"
+        elif READ_RE.search(user_message) and READ_VERB_RE.search(user_message):
+            intent = "READ_EMAILS"
+        else:
+            return None
+
+        return {
+            "intent": intent,
+            "parameters": {
+                "limit": min(int(limit.group(1)), FAST_PATH_MAX_LIMIT) if limit else None,
+                "sender": None,
+                "subject_keyword": None,
+                "email_index": None,
+                "category": None,
+                "custom_message": None
+            },
+            "confidence": FAST_PATH_CONFIDENCE
+        }
 
-            system_prompt = "You are an intent classification system. Always respond with valid JSON only."
+    async def classify_intent(self, user_message: str) -> Dict[str, Any]:
+        """
+        Classify user's intent and extract parameters using NLP.
 
-            user_prompt = f"""Analyze the following user message and determine the intent and extract relevant parameters.
+        Plain commands such as "show my emails" are matched lexically and
+        skip the AI call.
 
-User Message: "{user_message}"
+        Args:
+            user_message: User's natural language command
 
-Classify the intent as one of:
-- READ_EMAILS: User wants to see/read emails
-- GENERATE_REPLY: User wants to reply to an email
-- SEND_EMAIL: User wants to send a new email or confirm sending a reply
-- DELETE_EMAIL: User wants to delete an email
-- CATEGORIZE: User wants emails categorized or a daily digest
-- GENERAL_CHAT: General conversation or unclear intent
+        Returns:
+            Dictionary with intent and extracted parameters
+        """
+        cache_key = user_message.strip().lower()
+        cached = self._intent_cache.get(cache_key)
+        if cached is not None:
+            return cached
 
-Also extract these parameters if present:
-- limit: Number of emails (integer)
-- sender: Specific sender name or email
-- subject_keyword: Subject line keyword
-- email_index: Reference to a previously shown email (e.g., "email 2", "the first one")
-- category: Category mentioned (work, personal, urgent, promotions)
-- custom_message: Any custom message content the user wants to include
+        matched = self._match_intent(user_message)
+        if matched is not None:
+            logger.info(f"Intent matched without AI: {matched['intent']}")
+            return matched
 
-Respond ONLY with a JSON object in this exact format:
-{{
-  "intent": "INTENT_NAME",
-  "parameters": {{
-    "limit": number or null,
-    "sender": "string or null",
-    "subject_keyword": "string or null",
-    "email_index": number or null,
-    "category": "string or null",
-    "custom_message": "string or null"
-  }},
-  "confidence": 0.0 to 1.0
-}}"""
+        try:
+            logger.info(f"Classifying intent for message: {user_message[:50]}...")
 
-            result_text = await self.provider.generate_text(system_prompt, user_prompt, temperature=0.2, max_tokens=300)
+            system_prompt = _INTENT_SYSTEM
+            user_prompt = _INTENT_USER.format(user_message=user_message)
 
-            # Remove markdown code blocks if present
-            if result_text.startswith("```"):
-                result_text = result_text.split("```")[1]
-                if result_text.startswith("json"):
-                    result_text = result_text[4:]
-                result_text = result_text.strip()
+            result_text = await self._generate(system_prompt, user_prompt, temperature=0.2, max_tokens=300)
 
-            result = json.loads(result_text)
+            result = _parse_json(result_text)
             logger.info(f"Intent classified: {result.get('intent')} (confidence: {result.get('confidence')})")
+            self._intent_cache[cache_key] = result
             return result
 
         except Exception as e:
@@ -325,10 +629,13 @@ Respond ONLY with a JSON object in this exact format:
 
     async def categorize_emails(self, emails: List[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
         """
-        Categorize emails into groups (Work, Personal, Promotions, Urgent).
+        Categorize emails into groups (Work, Personal, Promotions, Urgent) and summarize them.
+
+        The same request returns a short summary per email, stored in email['ai_summary']
+        for emails that don't have one yet.
 
         Args:
-            emails: List of email dictionaries
+            emails: List of email dictionaries (summaries are added in place)
 
         Returns:
             Dictionary with categories as keys and email lists as values
@@ -337,65 +644,53 @@ Respond ONLY with a JSON object in this exact format:
             logger.info(f"Categorizing {len(emails)} emails")
 
             if not emails:
-                return {"Work": [], "Personal": [], "Promotions": [], "Urgent": []}
+                return {category: [] for category in EMAIL_CATEGORIES}
 
             # Create a summary of emails for categorization
             email_summaries = []
             for idx, email in enumerate(emails):
-                email_summaries.append(f"{idx}: From: {email.get('sender_name', 'Unknown')}, Subject: {email.get('subject', 'No subject')}, Snippet: {email.get('snippet', '')[:100]}")
+                email_summaries.append(f"{idx}: From: {email.get('sender_name', 'Unknown')}, Subject: {email.get('subject', 'No subject')}, Snippet: {email.get('snippet', '')[:200]}")
 
             emails_text = "\n".join(email_summaries)
 
-            system_prompt = "You are an email categorization system. Always respond with valid JSON only."
+            system_prompt = _CATEGORIZE_SYSTEM
+            user_prompt = _CATEGORIZE_USER.format(emails_text=emails_text)
 
-            user_prompt = f"""Categorize these emails into the following categories: Work, Personal, Promotions, Urgent.
-An email can belong to multiple categories if appropriate.
-
-Emails:
-{emails_text}
+            result_text = await self._generate(
+                system_prompt, user_prompt, temperature=0.3, max_tokens=60 * len(emails) + 300
+            )
 
-Respond with a JSON object where keys are email indices (0, 1, 2...) and values are arrays of categories.
-Example: {{"0": ["Work", "Urgent"], "1": ["Personal"], "2": ["Promotions"]}}
+            categorization = _parse_json(result_text)
 
-Respond ONLY with the JSON object, no other text."""
+            # Collect email indices per category, then build each category's list once
+            category_indices = defaultdict(list)
 
-            result_text = await self.provider.generate_text(system_prompt, user_prompt, temperature=0.3, max_tokens=500)
+            for idx, email in enumerate(emails):
+                result = categorization.get(str(idx), ["Personal"])
 
-            # Remove markdown code blocks if present
-            if result_text.startswith("```"):
-                result_text = result_text.split("```")[1]
-                if result_text.startswith("json"):
-                    result_text = result_text[4:]
-                result_text = result_text.strip()
+                # Accept the plain category list format as well
+                if isinstance(result, dict):
+                    email_categories = result.get("categories") or ["Personal"]
+                    if result.get("summary") and 'ai_summary' not in email:
+                        email['ai_summary'] = result["summary"]
+                else:
+                    email_categories = result
 
-            categorization = json.loads(result_text)
+                for category in email_categories:
+                    category_indices[category].append(idx)
 
-            # Organize emails by category
             categories = {
-                "Work": [],
-                "Personal": [],
-                "Promotions": [],
-                "Urgent": []
+                category: [emails[idx] for idx in category_indices[category]]
+                for category in EMAIL_CATEGORIES
             }
 
-            for idx, email in enumerate(emails):
-                email_categories = categorization.get(str(idx), ["Personal"])
-                for category in email_categories:
-                    if category in categories:
-                        categories[category].append(email)
-
             logger.info(f"Emails categorized successfully")
             return categories
 
         except Exception as e:
             logger.error(f"Error categorizing emails: {str(e)}")
             # Fallback: put all in Personal
-            return {
-                "Work": [],
-                "Personal": emails,
-                "Promotions": [],
-                "Urgent": []
-            }
+            return {category: emails if category == "Personal" else [] for category in EMAIL_CATEGORIES}
 
     async def generate_daily_digest(self, emails: List[Dict[str, Any]]) -> str:
         """
@@ -420,21 +715,10 @@ Respond ONLY with the JSON object, no other text."""
 
             emails_text = "\n---\n".join(email_data)
 
-            system_prompt = "You are a helpful email assistant creating daily digests."
-
-            user_prompt = f"""Create a daily email digest summary. Include:
-
-1. A brief overview of the day's emails
-2. Key emails that require attention
-3. Suggested actions or follow-ups
-4. Any urgent or time-sensitive items
-
-Emails:
-{emails_text}
-
-Format the digest in a clear, organized manner with bullet points and sections."""
+            system_prompt = _DIGEST_SYSTEM
+            user_prompt = _DIGEST_USER.format(emails_text=emails_text)
 
-            digest = await self.provider.generate_text(system_prompt, user_prompt, temperature=0.5, max_tokens=800)
+            digest = await self._generate(system_prompt, user_prompt, temperature=0.5, max_tokens=800)
             logger.info("Daily digest generated successfully")
             return digest
 
@@ -1,16 +1,78 @@
 """Authentication service for Google OAuth2 and JWT token management."""
+import asyncio
+import hashlib
 import logging
-from datetime import datetime, timedelta
+import threading
+import time
+from functools import lru_cache
+from datetime import datetime, timedelta, timezone
 from typing import Optional, Dict, Any
 import jwt
+import orjson
+from cachetools import TTLCache
+from cryptography.hazmat.primitives import serialization
+from google.auth.transport.requests import Request as GoogleAuthRequest
 from google_auth_oauthlib.flow import Flow
 from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
+from googleapiclient.discovery import build_from_document
+from googleapiclient.discovery_cache import get_static_doc
 
 from config import settings
 
 logger = logging.getLogger(__name__)
 
+# Live credentials per refresh token; an access token lasts an hour, so entries
+# expire five minutes before the token they were built with
+CREDENTIALS_CACHE_SIZE = 10_000
+CREDENTIALS_CACHE_TTL_SECONDS = 55 * 60
+
+# JWT algorithms signed with a private key rather than a shared secret
+ASYMMETRIC_JWT_ALGORITHMS = ("RS", "PS", "ES", "EdDSA")
+
+# Access tokens this close to expiry are refreshed in the background
+CREDENTIALS_REFRESH_WINDOW = timedelta(minutes=5)
+
+# How often cached credentials are checked for upcoming expiry
+CREDENTIALS_HEARTBEAT_SECONDS = 60
+
+# Issuers Google signs ID tokens with
+GOOGLE_ID_TOKEN_ISSUERS = ("https://accounts.google.com", "accounts.google.com")
+
+# Authorization URL parameters; offline access with forced consent returns a refresh token
+AUTHORIZATION_URL_PARAMS = {
+    'access_type': 'offline',
+    'include_granted_scopes': 'true',
+    'prompt': 'consent'
+}
+
+
+@lru_cache(maxsize=None)
+def _oauth2_discovery_doc() -> str:
+    """Read the OAuth2 discovery document bundled with the client, once per process."""
+    return get_static_doc('oauth2', 'v2')
+
+
+class OrjsonJWT(jwt.PyJWT):
+    """PyJWT with the payload serialized by orjson.
+
+    Overrides private PyJWT hooks, so requirements.txt pins PyJWT to one minor version.
+    """
+
+    def _encode_payload(self, payload: Dict[str, Any], headers=None, json_encoder=None) -> bytes:
+        return orjson.dumps(payload)
+
+    def _decode_payload(self, decoded: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            payload = orjson.loads(decoded["payload"])
+        except orjson.JSONDecodeError as e:
+            raise jwt.DecodeError(f"Invalid payload string: {e}") from e
+        if not isinstance(payload, dict):
+            raise jwt.DecodeError("Invalid payload string: must be a json object")
+        return payload
+
+
+_jwt = OrjsonJWT()
+
 
 class AuthService:
     """Handles Google OAuth2 authentication and session management."""
@@ -26,8 +88,32 @@ class AuthService:
                 "redirect_uris": [settings.GOOGLE_REDIRECT_URI]
             }
         }
+        # Load the JWT keys once; parsing a PEM key on every token is expensive
+        if settings.JWT_ALGORITHM.startswith(ASYMMETRIC_JWT_ALGORITHMS):
+            self._signing_key = serialization.load_pem_private_key(settings.JWT_SECRET_KEY.encode(), password=None)
+            self._verify_key = self._signing_key.public_key()
+        else:
+            self._signing_key = self._verify_key = settings.JWT_SECRET_KEY.encode()
+
+        self._scopes = tuple(settings.GMAIL_SCOPES)
+        # One flow builds every authorization URL; it keeps PKCE and session state, so it is locked
+        self._authorization_flow = self._new_flow()
+        self._authorization_lock = threading.Lock()
+
+        self._credentials_cache = TTLCache(maxsize=CREDENTIALS_CACHE_SIZE, ttl=CREDENTIALS_CACHE_TTL_SECONDS)
+        self._credentials_lock = threading.Lock()
+        # In-flight token refreshes, so each credential is refreshed once at a time
+        self._refresh_tasks: Dict[Credentials, asyncio.Task] = {}
         logger.info("AuthService initialized")
 
+    def _new_flow(self) -> Flow:
+        """Create an OAuth2 flow for the configured client."""
+        return Flow.from_client_config(
+            self.client_config,
+            scopes=self._scopes,
+            redirect_uri=settings.GOOGLE_REDIRECT_URI
+        )
+
     def get_authorization_url(self, state: Optional[str] = None) -> str:
         """
         Generate Google OAuth2 authorization URL.
@@ -39,18 +125,13 @@ class AuthService:
             Authorization URL string
         """
         try:
-            flow = Flow.from_client_config(
-                self.client_config,
-                scopes=settings.GMAIL_SCOPES,
-                redirect_uri=settings.GOOGLE_REDIRECT_URI
-            )
-
-            authorization_url, _ = flow.authorization_url(
-                access_type='offline',
-                include_granted_scopes='true',
-                prompt='consent',
-                state=state
-            )
+            with self._authorization_lock:
+                # Generate a new PKCE code challenge for every URL
+                self._authorization_flow.code_verifier = None
+                authorization_url, _ = self._authorization_flow.authorization_url(
+                    state=state,
+                    **AUTHORIZATION_URL_PARAMS
+                )
 
             logger.info("Generated authorization URL")
             return authorization_url
@@ -70,19 +151,18 @@ class AuthService:
             Dictionary containing tokens and user info
         """
         try:
-            flow = Flow.from_client_config(
-                self.client_config,
-                scopes=settings.GMAIL_SCOPES,
-                redirect_uri=settings.GOOGLE_REDIRECT_URI
-            )
+            # Token exchange stores the credentials on the flow, so it gets its own
+            flow = self._new_flow()
 
             # Exchange code for tokens
             flow.fetch_token(code=code)
             credentials = flow.credentials
 
-            # Get user info
-            user_info_service = build('oauth2', 'v2', credentials=credentials)
-            user_info = user_info_service.userinfo().get().execute()
+            # Get user info from the ID token, falling back to the userinfo endpoint
+            user_info = self._user_info_from_id_token(credentials.id_token)
+            if user_info is None:
+                user_info_service = build_from_document(orjson.loads(_oauth2_discovery_doc()), credentials=credentials)
+                user_info = user_info_service.userinfo().get().execute()
 
             token_data = {
                 "access_token": credentials.token,
@@ -91,7 +171,8 @@ class AuthService:
                 "client_id": credentials.client_id,
                 "client_secret": credentials.client_secret,
                 "scopes": credentials.scopes,
-                "expiry": credentials.expiry.isoformat() if credentials.expiry else None,
+                # Epoch seconds; google-auth stores expiry as naive UTC
+                "expiry": int(credentials.expiry.replace(tzinfo=timezone.utc).timestamp()) if credentials.expiry else None,
                 "user_info": {
                     "email": user_info.get("email"),
                     "name": user_info.get("name"),
@@ -107,10 +188,51 @@ class AuthService:
             logger.error(f"Error exchanging code for tokens: {str(e)}")
             raise
 
+    def _user_info_from_id_token(self, id_token: Optional[str]) -> Optional[Dict[str, Any]]:
+        """
+        Read the user's profile from the ID token returned with the access token.
+
+        The token comes straight from Google's token endpoint over TLS, so
+        OpenID Connect allows skipping the signature check; the audience,
+        issuer and expiry are still validated.
+
+        Args:
+            id_token: ID token from the token response, if any
+
+        Returns:
+            User info in the userinfo endpoint's shape, or None if the token is missing or unusable
+        """
+        if not id_token:
+            return None
+
+        try:
+            claims = _jwt.decode(
+                id_token,
+                options={"verify_signature": False, "verify_aud": True, "verify_iss": True, "verify_exp": True},
+                audience=settings.GOOGLE_CLIENT_ID,
+                issuer=GOOGLE_ID_TOKEN_ISSUERS
+            )
+        except jwt.InvalidTokenError as e:
+            logger.warning(f"Could not read ID token, using userinfo endpoint: {str(e)}")
+            return None
+
+        if not claims.get("email"):
+            return None
+
+        return {
+            "email": claims.get("email"),
+            "name": claims.get("name"),
+            "picture": claims.get("picture"),
+            "id": claims.get("sub")
+        }
+
     def create_jwt_token(self, user_data: Dict[str, Any]) -> str:
         """
         Create a JWT token for session management.
 
+        Only the user's own tokens are stored; the OAuth client settings are the
+        same for every user and are filled in from configuration when needed.
+
         Args:
             user_data: User information and credentials
 
@@ -118,22 +240,19 @@ class AuthService:
             JWT token string
         """
         try:
+            now = int(time.time())
             payload = {
                 "user_info": user_data.get("user_info"),
                 "credentials": {
                     "access_token": user_data.get("access_token"),
                     "refresh_token": user_data.get("refresh_token"),
-                    "token_uri": user_data.get("token_uri"),
-                    "client_id": user_data.get("client_id"),
-                    "client_secret": user_data.get("client_secret"),
-                    "scopes": user_data.get("scopes"),
                     "expiry": user_data.get("expiry")
                 },
-                "exp": datetime.utcnow() + timedelta(hours=settings.JWT_EXPIRATION_HOURS),
-                "iat": datetime.utcnow()
+                "exp": now + settings.JWT_EXPIRATION_HOURS * 3600,
+                "iat": now
             }
 
-            token = jwt.encode(payload, settings.JWT_SECRET_KEY, algorithm=settings.JWT_ALGORITHM)
+            token = _jwt.encode(payload, self._signing_key, algorithm=settings.JWT_ALGORITHM)
             logger.info("JWT token created successfully")
             return token
 
@@ -152,9 +271,9 @@ class AuthService:
             Decoded token payload or None if invalid
         """
         try:
-            payload = jwt.decode(
+            payload = _jwt.decode(
                 token,
-                settings.JWT_SECRET_KEY,
+                self._verify_key,
                 algorithms=[settings.JWT_ALGORITHM]
             )
             logger.debug("JWT token verified successfully")
@@ -171,33 +290,124 @@ class AuthService:
         """
         Reconstruct Google credentials from token data.
 
+        Credentials are cached per refresh token, so a token refreshed by one
+        request is reused by the next instead of being refreshed again.
+
         Args:
             credentials_data: Credentials dictionary from JWT
 
         Returns:
             Google Credentials object
         """
+        token = credentials_data.get("refresh_token") or credentials_data.get("access_token")
+        key = hashlib.sha256(token.encode()).hexdigest() if token else None
+
+        if key is not None:
+            with self._credentials_lock:
+                cached = self._credentials_cache.get(key)
+            if cached is not None:
+                return cached
+
         try:
-            expiry = None
-            if credentials_data.get("expiry"):
-                expiry = datetime.fromisoformat(credentials_data["expiry"])
+            expiry = credentials_data.get("expiry")
+            if isinstance(expiry, str):
+                # Tokens issued before expiry became epoch seconds carry an ISO string
+                expiry = datetime.fromisoformat(expiry)
+                if expiry.tzinfo is None:
+                    expiry = expiry.replace(tzinfo=timezone.utc)
+            elif expiry:
+                expiry = datetime.fromtimestamp(expiry, timezone.utc)
+            else:
+                expiry = None
+
+            if expiry is not None:
+                # google-auth compares expiry against naive UTC
+                expiry = expiry.astimezone(timezone.utc).replace(tzinfo=None)
 
             credentials = Credentials(
                 token=credentials_data.get("access_token"),
                 refresh_token=credentials_data.get("refresh_token"),
-                token_uri=credentials_data.get("token_uri"),
-                client_id=credentials_data.get("client_id"),
-                client_secret=credentials_data.get("client_secret"),
-                scopes=credentials_data.get("scopes"),
+                # Tokens issued before the payload was trimmed still carry these
+                token_uri=credentials_data.get("token_uri") or self.client_config["web"]["token_uri"],
+                client_id=credentials_data.get("client_id") or settings.GOOGLE_CLIENT_ID,
+                client_secret=credentials_data.get("client_secret") or settings.GOOGLE_CLIENT_SECRET,
+                scopes=credentials_data.get("scopes") or settings.GMAIL_SCOPES,
                 expiry=expiry
             )
 
+            if key is not None:
+                with self._credentials_lock:
+                    # Keep the first instance if another request built one meanwhile
+                    credentials = self._credentials_cache.setdefault(key, credentials)
+
             return credentials
 
         except Exception as e:
             logger.error(f"Error reconstructing credentials: {str(e)}")
             raise
 
+    async def get_fresh_credentials(self, credentials: Credentials) -> Credentials:
+        """
+        Make sure credentials are usable now, refreshing ahead of expiry off the request path.
+
+        Tokens close to expiry are returned as-is while a refresh runs in the
+        background; only an expired token waits for the refresh.
+
+        Args:
+            credentials: Google credentials to check
+
+        Returns:
+            The same credentials, refreshed if they had expired
+        """
+        if not credentials.refresh_token or credentials.expiry is None:
+            return credentials
+
+        # google-auth stores expiry as naive UTC
+        remaining = credentials.expiry.replace(tzinfo=timezone.utc) - datetime.now(timezone.utc)
+        if remaining > CREDENTIALS_REFRESH_WINDOW:
+            return credentials
+
+        task = self._refresh_tasks.get(credentials)
+        if task is None:
+            task = asyncio.create_task(self._refresh(credentials))
+            self._refresh_tasks[credentials] = task
+            task.add_done_callback(lambda _: self._refresh_tasks.pop(credentials, None))
+
+        if remaining <= timedelta(0):
+            await asyncio.shield(task)
+
+        return credentials
+
+    async def _refresh(self, credentials: Credentials) -> None:
+        """
+        Refresh an access token in a worker thread, logging failures.
+
+        Args:
+            credentials: Google credentials to refresh in place
+        """
+        try:
+            await asyncio.to_thread(credentials.refresh, GoogleAuthRequest())
+            logger.info("Refreshed Google access token")
+
+        except Exception as e:
+            logger.error(f"Error refreshing Google access token: {str(e)}")
+
+    async def refresh_expiring_credentials(self) -> None:
+        """Refresh every cached credential that is within the refresh window of expiry."""
+        with self._credentials_lock:
+            cached = list(self._credentials_cache.values())
+
+        await asyncio.gather(*(self.get_fresh_credentials(credentials) for credentials in cached))
+
+    async def run_credentials_heartbeat(self) -> None:
+        """Periodically refresh cached credentials before they expire, until cancelled."""
+        while True:
+            await asyncio.sleep(CREDENTIALS_HEARTBEAT_SECONDS)
+            try:
+                await self.refresh_expiring_credentials()
+            except Exception as e:
+                logger.error(f"Error in credentials heartbeat: {str(e)}")
+
 
 # Global auth service instance
 auth_service = AuthService()
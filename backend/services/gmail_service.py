@@ -1,18 +1,91 @@
 """Gmail service for email operations."""
+import asyncio
 import logging
 import base64
+import binascii
+import re
+import threading
+from asyncio import to_thread
+from functools import lru_cache
 from email.mime.text import MIMEText
-from typing import List, Dict, Any, Optional
+from typing import Callable, List, Dict, Any, Optional
+import google_auth_httplib2
+import httplib2
+from cachetools import TTLCache
 from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
+import orjson
+from googleapiclient.discovery import build_from_document
+from googleapiclient.discovery_cache import get_static_doc
 from googleapiclient.errors import HttpError
+from googleapiclient.http import HttpRequest
+from googleapiclient.model import JsonModel
 
 logger = logging.getLogger(__name__)
 
+# Headers requested for metadata-only (list view) fetches
+METADATA_HEADERS = ['Subject', 'From', 'To', 'Date', 'Message-ID']
+
+# Lowercase names of the headers _parse_email reads; full messages carry dozens of others
+PARSED_HEADERS = frozenset(name.lower() for name in METADATA_HEADERS)
+
+# Partial response fields for metadata-only fetches
+METADATA_FIELDS = 'id,threadId,snippet,labelIds,payload/headers'
+
+# Partial response fields for full fetches: only what _parse_email reads.
+# The innermost 'parts' selects the whole subtree for deeply nested messages.
+FULL_FIELDS = (
+    'id,threadId,snippet,labelIds,'
+    'payload(headers,body/data,parts(mimeType,body/data,parts(mimeType,body/data,parts)))'
+)
+
+# Maximum number of calls Gmail accepts in one batch request
+BATCH_LIMIT = 100
+
+# Socket timeout for Gmail API connections
+HTTP_TIMEOUT_SECONDS = 60
+
+# Body characters kept per email, enough for summaries and replies
+BODY_MAX_CHARS = 4000
+
+# Parsed messages per service, keyed by message ID and format. Message content never
+# changes for an ID; labels may lag by up to the TTL. Sized for one dashboard view
+# (the 20-email digest plus a few reads), since every pooled user has a cache.
+MESSAGE_CACHE_SIZE = 50
+MESSAGE_CACHE_TTL_SECONDS = 10 * 60
+
+# Start of a quoted reply chain, e.g. "On Mon, 1 Jan 2024, John <john@example.com> wrote:"
+QUOTED_REPLY_RE = re.compile(
+    r'^(?:On\b[^\n]*(?:\n[^\n]*)?\bwrote:|-{2,}\s*Original Message\s*-{2,})\s*$',
+    re.M | re.I
+)
+
+# Maps the base64url alphabet onto standard base64 for binascii
+B64URL_TO_STD = bytes.maketrans(b'-_', b'+/')
+
+
+@lru_cache(maxsize=None)
+def _gmail_discovery_doc() -> str:
+    """Read the Gmail discovery document bundled with the client, once per process."""
+    return get_static_doc('gmail', 'v1')
+
+
+class OrjsonModel(JsonModel):
+    """JSON model that parses API responses with orjson, straight from the response bytes."""
+
+    def deserialize(self, content):
+        # Invalid JSON raises so a truncated or HTML body is not mistaken for a response
+        if not content:
+            return self.no_content_response
+        return orjson.loads(content)
+
 
 class GmailService:
     """Handles Gmail API operations."""
 
+    # Connections per worker thread, shared by every user's service so keep-alive
+    # connections to Google are reused across requests
+    _connections = threading.local()
+
     def __init__(self, credentials: Credentials):
         """
         Initialize Gmail service with user credentials.
@@ -21,15 +94,62 @@ class GmailService:
             credentials: Google OAuth2 credentials
         """
         self.credentials = credentials
-        self.service = build('gmail', 'v1', credentials=credentials)
+        self._local = threading.local()
+        self._message_cache = TTLCache(maxsize=MESSAGE_CACHE_SIZE, ttl=MESSAGE_CACHE_TTL_SECONDS)
+        # Build from the bundled discovery document; the client modifies the parsed
+        # document, so each service gets its own copy
+        self.service = build_from_document(
+            orjson.loads(_gmail_discovery_doc()),
+            credentials=credentials,
+            model=OrjsonModel(),
+            requestBuilder=self._build_request
+        )
         logger.info("GmailService initialized")
 
-    async def fetch_emails(self, max_results: int = 5) -> List[Dict[str, Any]]:
+    def _build_request(self, http, *args, **kwargs) -> HttpRequest:
+        """
+        Build API requests on an HTTP client owned by the current thread.
+
+        httplib2 is not thread-safe and API calls run in worker threads,
+        so every thread gets its own authorized client, wrapping that
+        thread's shared connections.
+        """
+        authorized_http = getattr(self._local, 'http', None)
+        if authorized_http is None:
+            authorized_http = google_auth_httplib2.AuthorizedHttp(self.credentials, http=self._thread_http())
+            self._local.http = authorized_http
+        return HttpRequest(authorized_http, *args, **kwargs)
+
+    @classmethod
+    def _thread_http(cls) -> httplib2.Http:
+        """Return the current thread's shared HTTP client, creating it on first use."""
+        http = getattr(cls._connections, 'http', None)
+        if http is None:
+            http = httplib2.Http(timeout=HTTP_TIMEOUT_SECONDS)
+            cls._connections.http = http
+        return http
+
+    async def _execute(self, build_request: Callable[[], HttpRequest]) -> Any:
+        """
+        Build and execute an API request in a worker thread.
+
+        The Google API client is synchronous, so calls are kept off the event loop.
+
+        Args:
+            build_request: Callable returning the request to execute
+
+        Returns:
+            Decoded API response
+        """
+        return await to_thread(lambda: build_request().execute())
+
+    async def fetch_emails(self, max_results: int = 5, light: bool = True) -> List[Dict[str, Any]]:
         """
         Fetch the most recent emails from the user's inbox.
 
         Args:
             max_results: Maximum number of emails to fetch
+            light: Fetch only headers and snippet, leaving the body empty
 
         Returns:
             List of email dictionaries with metadata and content
@@ -38,11 +158,12 @@ class GmailService:
             logger.info(f"Fetching {max_results} emails from inbox")
 
             # List messages
-            results = self.service.users().messages().list(
+            results = await self._execute(lambda: self.service.users().messages().list(
                 userId='me',
                 maxResults=max_results,
-                labelIds=['INBOX']
-            ).execute()
+                labelIds=['INBOX'],
+                fields='messages(id)'
+            ))
 
             messages = results.get('messages', [])
 
@@ -50,16 +171,7 @@ class GmailService:
                 logger.info("No messages found")
                 return []
 
-            emails = []
-            for message in messages:
-                msg = self.service.users().messages().get(
-                    userId='me',
-                    id=message['id'],
-                    format='full'
-                ).execute()
-
-                email_data = self._parse_email(msg)
-                emails.append(email_data)
+            emails = await self._get_messages([m['id'] for m in messages], **self._get_params(light))
 
             logger.info(f"Successfully fetched {len(emails)} emails")
             return emails
@@ -71,13 +183,14 @@ class GmailService:
             logger.error(f"Unexpected error fetching emails: {str(e)}")
             raise
 
-    async def fetch_emails_with_query(self, query: str, max_results: int = 20) -> List[Dict[str, Any]]:
+    async def fetch_emails_with_query(self, query: str, max_results: int = 20, light: bool = True) -> List[Dict[str, Any]]:
         """
         Fetch emails matching a specific query.
 
         Args:
             query: Gmail search query (e.g., 'from:john@example.com')
             max_results: Maximum number of emails to fetch
+            light: Fetch only headers and snippet, leaving the body empty
 
         Returns:
             List of email dictionaries
@@ -85,11 +198,12 @@ class GmailService:
         try:
             logger.info(f"Fetching emails with query: {query}")
 
-            results = self.service.users().messages().list(
+            results = await self._execute(lambda: self.service.users().messages().list(
                 userId='me',
                 q=query,
-                maxResults=max_results
-            ).execute()
+                maxResults=max_results,
+                fields='messages(id)'
+            ))
 
             messages = results.get('messages', [])
 
@@ -97,16 +211,7 @@ class GmailService:
                 logger.info(f"No messages found for query: {query}")
                 return []
 
-            emails = []
-            for message in messages:
-                msg = self.service.users().messages().get(
-                    userId='me',
-                    id=message['id'],
-                    format='full'
-                ).execute()
-
-                email_data = self._parse_email(msg)
-                emails.append(email_data)
+            emails = await self._get_messages([m['id'] for m in messages], **self._get_params(light))
 
             logger.info(f"Found {len(emails)} emails matching query")
             return emails
@@ -118,6 +223,133 @@ class GmailService:
             logger.error(f"Unexpected error with query: {str(e)}")
             raise
 
+    @staticmethod
+    def _get_params(light: bool) -> Dict[str, Any]:
+        """
+        Build users.messages.get parameters for a list fetch.
+
+        Args:
+            light: Request the parsed headers and snippet only, skipping the body
+
+        Returns:
+            Keyword arguments for users.messages.get
+        """
+        if light:
+            return {
+                'format': 'metadata',
+                'metadataHeaders': METADATA_HEADERS,
+                'fields': METADATA_FIELDS
+            }
+        return {'format': 'full', 'fields': FULL_FIELDS}
+
+    async def _get_messages(self, message_ids: List[str], **get_params: Any) -> List[Dict[str, Any]]:
+        """
+        Fetch several messages with concurrent batch HTTP requests of up to BATCH_LIMIT calls.
+
+        Messages parsed recently are served from cache. If a batch request itself
+        fails, its messages are fetched individually.
+
+        Args:
+            message_ids: Gmail message IDs
+            **get_params: Extra parameters for users.messages.get
+
+        Returns:
+            List of parsed email dictionaries in message_ids order, skipping messages that failed
+        """
+        fmt = get_params.get('format')
+
+        # Emails keyed by position in message_ids, which is also the batch request ID
+        emails: Dict[int, Dict[str, Any]] = {}
+        pending: List[int] = []
+        for idx, message_id in enumerate(message_ids):
+            cached = self._message_cache.get((message_id, fmt))
+            if cached is None:
+                pending.append(idx)
+            else:
+                emails[idx] = cached
+
+        responses: Dict[int, Dict[str, Any]] = {}
+
+        def collect(request_id, response, exception):
+            if exception is not None:
+                logger.error(f"Gmail API error fetching message in batch: {exception}")
+                return
+            responses[int(request_id)] = response
+
+        def run_batch(chunk):
+            batch = self.service.new_batch_http_request(callback=collect)
+            for idx in chunk:
+                batch.add(
+                    self.service.users().messages().get(userId='me', id=message_ids[idx], **get_params),
+                    request_id=str(idx)
+                )
+            batch.execute()
+
+        async def fetch_chunk(chunk):
+            try:
+                # Build and run the batch in a worker thread so it uses that thread's client
+                await to_thread(run_batch, chunk)
+            except HttpError as error:
+                logger.warning(f"Gmail batch request failed, fetching messages individually: {error}")
+                results = await asyncio.gather(
+                    *(self._execute(lambda message_id=message_ids[idx]: self.service.users().messages().get(
+                        userId='me', id=message_id, **get_params
+                    )) for idx in chunk),
+                    return_exceptions=True
+                )
+                for idx, result in zip(chunk, results):
+                    if isinstance(result, Exception):
+                        logger.error(f"Gmail API error fetching message: {result}")
+                    else:
+                        responses[idx] = result
+
+        # Run the batches concurrently, each on its own worker thread and connection
+        await asyncio.gather(*(fetch_chunk(pending[start:start + BATCH_LIMIT])
+                               for start in range(0, len(pending), BATCH_LIMIT)))
+
+        for idx, response in responses.items():
+            email = self._parse_email(response)
+            self._message_cache[(message_ids[idx], fmt)] = email
+            emails[idx] = email
+
+        # Callers annotate emails (e.g. with summaries), so hand out copies of cached entries
+        return [dict(emails[idx]) for idx in sorted(emails)]
+
+    async def get_email_by_id(self, message_id: str) -> Dict[str, Any]:
+        """
+        Fetch a single email by its message ID.
+
+        Args:
+            message_id: Gmail message ID
+
+        Returns:
+            Parsed email dictionary
+        """
+        try:
+            logger.info(f"Fetching email with ID: {message_id}")
+
+            cached = self._message_cache.get((message_id, 'full'))
+            if cached is not None:
+                return dict(cached)
+
+            msg = await self._execute(lambda: self.service.users().messages().get(
+                userId='me',
+                id=message_id,
+                format='full',
+                fields=FULL_FIELDS
+            ))
+
+            email = self._parse_email(msg)
+            self._message_cache[(message_id, 'full')] = email
+            return dict(email)
+
+        except HttpError as error:
+            logger.error(f"Gmail API error while fetching email: {error}")
+            raise
+        except Exception as e:
+            logger.error(f"Unexpected error fetching email: {str(e)}")
+            raise
+
     def _parse_email(self, message: Dict[str, Any]) -> Dict[str, Any]:
         """
         Parse a Gmail message into a structured format.
@@ -128,17 +360,22 @@ class GmailService:
         Returns:
             Parsed email dictionary
         """
-        headers = message.get('payload', {}).get('headers', [])
+        # Index the parsed headers in one pass, keeping the first value of repeated headers
+        headers = {}
+        for header in message.get('payload', {}).get('headers', ()):
+            name = header['name'].lower()
+            if name in PARSED_HEADERS and name not in headers:
+                headers[name] = header['value']
 
         # Extract header information
-        subject = next((h['value'] for h in headers if h['name'].lower() == 'subject'), 'No Subject')
-        from_header = next((h['value'] for h in headers if h['name'].lower() == 'from'), 'Unknown Sender')
-        to_header = next((h['value'] for h in headers if h['name'].lower() == 'to'), '')
-        date = next((h['value'] for h in headers if h['name'].lower() == 'date'), '')
-        message_id_header = next((h['value'] for h in headers if h['name'].lower() == 'message-id'), '')
+        subject = headers.get('subject', 'No Subject')
+        from_header = headers.get('from', 'Unknown Sender')
+        to_header = headers.get('to', '')
+        date = headers.get('date', '')
+        message_id_header = headers.get('message-id', '')
 
-        # Extract body
-        body = self._extract_body(message.get('payload', {}))
+        # Extract body, keeping only the new message content
+        body = self._clean_body(self._extract_body(message.get('payload', {})))
 
         # Parse sender information
         sender_name, sender_email = self._parse_email_address(from_header)
@@ -168,28 +405,56 @@ class GmailService:
             payload: Email payload object
 
         Returns:
-            Decoded email body text
-        """
-        body = ""
-
-        if 'body' in payload and payload['body'].get('data'):
-            body = base64.urlsafe_b64decode(payload['body']['data']).decode('utf-8', errors='ignore')
-        elif 'parts' in payload:
-            for part in payload['parts']:
-                if part.get('mimeType') == 'text/plain':
-                    if 'data' in part.get('body', {}):
-                        body = base64.urlsafe_b64decode(part['body']['data']).decode('utf-8', errors='ignore')
-                        break
-                elif part.get('mimeType') == 'text/html' and not body:
-                    if 'data' in part.get('body', {}):
-                        body = base64.urlsafe_b64decode(part['body']['data']).decode('utf-8', errors='ignore')
-                elif 'parts' in part:
-                    # Recursive for nested parts
-                    body = self._extract_body(part)
-                    if body:
-                        break
-
-        return body
+            Decoded email body text, preferring text/plain over text/html
+        """
+        data = payload.get('body', {}).get('data')
+
+        if not data:
+            # Walk the MIME tree in document order, decoding only the part that is used
+            html_data = None
+            stack = list(reversed(payload.get('parts', ())))
+            while stack:
+                part = stack.pop()
+                mime_type = part.get('mimeType')
+                part_data = part.get('body', {}).get('data')
+                if mime_type == 'text/plain' and part_data:
+                    data = part_data
+                    break
+                if mime_type == 'text/html' and part_data and html_data is None:
+                    html_data = part_data
+                stack.extend(reversed(part.get('parts', ())))
+            else:
+                data = html_data
+
+        if not data:
+            return ""
+
+        # Decode in C directly; Gmail may omit the base64 padding
+        padding = b'=' * (-len(data) % 4)
+        raw = binascii.a2b_base64(data.encode('ascii').translate(B64URL_TO_STD) + padding)
+        return raw.decode('utf-8', errors='ignore')
+
+    def _clean_body(self, body: str) -> str:
+        """
+        Drop quoted reply chains from an email body and cap its length.
+
+        Args:
+            body: Decoded email body text
+
+        Returns:
+            Body text of at most BODY_MAX_CHARS characters
+        """
+        quoted = QUOTED_REPLY_RE.search(body)
+        if quoted and quoted.start() > 0:
+            body = body[:quoted.start()]
+
+        # Only a trailing run of "> " lines is a reply chain; inline ones answer point by point
+        lines = body.rstrip().split('\n')
+        while len(lines) > 1 and (lines[-1].startswith('>') or not lines[-1].strip()):
+            lines.pop()
+        body = '\n'.join(lines).strip()
+
+        return body[:BODY_MAX_CHARS]
 
     def _parse_email_address(self, email_str: str) -> tuple[str, str]:
         """
@@ -201,12 +466,10 @@ class GmailService:
         Returns:
             Tuple of (name, email)
         """
-        if '<' in email_str and '>' in email_str:
-            name = email_str.split('<')[0].strip().strip('"')
-            email = email_str.split('<')[1].split('>')[0].strip()
-            return name, email
-        else:
-            return email_str, email_str
+        name, bracket, rest = email_str.partition('<')
+        if bracket and '>' in rest:
+            return name.strip().strip('"'), rest.partition('>')[0].strip()
+        return email_str, email_str
 
     async def send_email(self, to: str, subject: str, body: str, thread_id: Optional[str] = None) -> Dict[str, Any]:
         """
@@ -224,20 +487,16 @@ class GmailService:
         try:
             logger.info(f"Sending email to: {to}")
 
-            message = MIMEText(body)
-            message['to'] = to
-            message['subject'] = subject
-
-            raw_message = base64.urlsafe_b64encode(message.as_bytes()).decode('utf-8')
+            raw_message = base64.urlsafe_b64encode(self._build_message(to, subject, body)).decode('utf-8')
 
             send_body = {'raw': raw_message}
             if thread_id:
                 send_body['threadId'] = thread_id
 
-            sent_message = self.service.users().messages().send(
+            sent_message = await self._execute(lambda: self.service.users().messages().send(
                 userId='me',
                 body=send_body
-            ).execute()
+            ))
 
             logger.info(f"Email sent successfully. Message ID: {sent_message['id']}")
             return {
@@ -253,6 +512,39 @@ class GmailService:
             logger.error(f"Unexpected error sending email: {str(e)}")
             raise
 
+    @staticmethod
+    def _build_message(to: str, subject: str, body: str) -> bytes:
+        """
+        Build a plain text RFC 5322 message.
+
+        Plain ASCII headers are written directly, which is far cheaper than the
+        email package; anything needing RFC 2047 encoding goes through MIMEText.
+
+        Args:
+            to: Recipient email address
+            subject: Email subject
+            body: Email body content
+
+        Returns:
+            Message bytes
+        """
+        headers = to + subject
+        if not headers.isascii() or '\r' in headers or '\n' in headers:
+            message = MIMEText(body)
+            message['to'] = to
+            message['subject'] = subject
+            return message.as_bytes()
+
+        return (
+            f'To: {to}\r\n'
+            f'Subject: {subject}\r\n'
+            'MIME-Version: 1.0\r\n'
+            'Content-Type: text/plain; charset="utf-8"\r\n'
+            'Content-Transfer-Encoding: 8bit\r\n'
+            '\r\n'
+            + body.replace('\r\n', '\n').replace('\n', '\r\n')
+        ).encode('utf-8')
+
     async def delete_email(self, message_id: str) -> bool:
         """
         Delete (trash) an email by message ID.
@@ -266,10 +558,10 @@ class GmailService:
         try:
             logger.info(f"Deleting email with ID: {message_id}")
 
-            self.service.users().messages().trash(
+            await self._execute(lambda: self.service.users().messages().trash(
                 userId='me',
                 id=message_id
-            ).execute()
+            ))
 
             logger.info(f"Email {message_id} moved to trash successfully")
             return True
@@ -289,7 +581,7 @@ class GmailService:
             User profile dictionary
         """
         try:
-            profile = self.service.users().getProfile(userId='me').execute()
+            profile = await self._execute(lambda: self.service.users().getProfile(userId='me'))
             logger.info(f"Retrieved profile for: {profile.get('emailAddress')}")
             return profile
 
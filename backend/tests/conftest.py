@@ -0,0 +1,220 @@
+"""Shared test fixtures."""
+import base64
+from types import MappingProxyType
+from unittest.mock import Mock
+from urllib.parse import parse_qs, urlsplit
+
+import httplib2
+import orjson
+import pytest
+from googleapiclient.discovery_cache import get_static_doc
+
+# Constructor arguments shared by every mock Google credentials object
+MOCK_CREDENTIALS_INFO = {
+    'token': 'mock_token',
+    'refresh_token': 'mock_refresh',
+    'token_uri': 'https://oauth2.googleapis.com/token',
+    'client_id': 'mock_id',
+    'client_secret': 'mock_secret'
+}
+
+# Body of mock_gmail_message, encoded once at import as Gmail sends it
+MOCK_BODY = 'This is test email body'
+MOCK_BODY_B64 = base64.urlsafe_b64encode(MOCK_BODY.encode()).decode()
+
+MOCK_GMAIL_MESSAGE = MappingProxyType({
+    'id': 'msg123',
+    'threadId': 'thread123',
+    'snippet': 'This is a test email snippet',
+    'payload': MappingProxyType({
+        'headers': tuple(MappingProxyType(header) for header in (
+            {'name': 'Subject', 'value': 'Test Subject'},
+            {'name': 'From', 'value': 'John Doe <john@example.com>'},
+            {'name': 'To', 'value': 'test@example.com'},
+            {'name': 'Date', 'value': 'Mon, 1 Jan 2024 12:00:00 +0000'},
+            {'name': 'Message-ID', 'value': '<msg123@example.com>'}
+        )),
+        'body': MappingProxyType({
+            'data': MOCK_BODY_B64
+        })
+    }),
+    'labelIds': ('INBOX', 'UNREAD')
+})
+
+# users.messages methods and shared parameters from the discovery document GmailService
+# builds from, so the Gmail API double rejects calls the real client would reject
+_GMAIL_DISCOVERY = orjson.loads(get_static_doc('gmail', 'v1'))
+GMAIL_MESSAGE_METHODS = _GMAIL_DISCOVERY['resources']['users']['resources']['messages']['methods']
+GMAIL_STANDARD_PARAMETERS = frozenset(_GMAIL_DISCOVERY['parameters'])
+
+
+@pytest.fixture(scope="session")
+def make_credentials():
+    """Return a factory for mock Google credentials; keyword arguments override the defaults."""
+    from google.oauth2.credentials import Credentials
+
+    def make(**overrides):
+        return Credentials(**{**MOCK_CREDENTIALS_INFO, **overrides})
+    return make
+
+
+@pytest.fixture(scope="session")
+def mock_credentials():
+    """Create mock Google credentials for services that only pass them through; no test refreshes them."""
+    from google.oauth2.credentials import Credentials
+
+    return Mock(spec=Credentials, **MOCK_CREDENTIALS_INFO)
+
+
+@pytest.fixture
+def mock_body():
+    """The decoded body of mock_gmail_message."""
+    return MOCK_BODY
+
+
+@pytest.fixture(scope="session")
+def mock_gmail_message():
+    """Mock Gmail message, read-only so the session can share it; dict() a copy to vary it."""
+    return MOCK_GMAIL_MESSAGE
+
+
+class FakeRequest:
+    """Stand-in for HttpRequest returning a canned response or raising a canned error."""
+
+    def __init__(self, result):
+        self._result = result
+
+    def execute(self, http=None):
+        if isinstance(self._result, Exception):
+            raise self._result
+        return self._result
+
+
+class FakeBatch:
+    """Stand-in for BatchHttpRequest that runs added requests in reverse order."""
+
+    def __init__(self, callback=None, error=None):
+        self.callback = callback
+        self.error = error
+        self.requests = []
+
+    def add(self, request, callback=None, request_id=None):
+        self.requests.append((request_id or str(len(self.requests) + 1), request))
+
+    def execute(self, http=None):
+        if self.error is not None:
+            raise self.error
+        # Real batches may call back in any order
+        for request_id, request in reversed(self.requests):
+            self.callback(request_id, request.execute(), None)
+
+
+class FakeMessages:
+    """users().messages() resource of FakeGmailService."""
+
+    def __init__(self, service):
+        self._service = service
+
+    def _record(self, method, kwargs):
+        """Check a call against the discovery document and record it."""
+        spec = GMAIL_MESSAGE_METHODS[method]
+        parameters = spec['parameters']
+        for name in kwargs:
+            if name not in parameters and name not in GMAIL_STANDARD_PARAMETERS and not (
+                name == 'body' and 'request' in spec
+            ):
+                raise TypeError(f'Got an unexpected keyword argument {name}')
+        for name, parameter in parameters.items():
+            if parameter.get('required') and name not in kwargs:
+                raise TypeError(f'Missing required parameter "{name}"')
+        self._service.calls.append((method, kwargs))
+
+    def list(self, **kwargs):
+        self._record('list', kwargs)
+        return FakeRequest({'messages': [{'id': message_id} for message_id in self._service.mailbox]})
+
+    def get(self, **kwargs):
+        self._record('get', kwargs)
+        return FakeRequest(self._service.mailbox[kwargs['id']])
+
+    def send(self, **kwargs):
+        self._record('send', kwargs)
+        return FakeRequest(self._service.sent_message)
+
+    def trash(self, **kwargs):
+        self._record('trash', kwargs)
+        return FakeRequest({})
+
+
+class FakeGmailService:
+    """
+    Lightweight double for the Gmail API client.
+
+    Messages are served from `mailbox` (ID -> raw message, in list order) and
+    every call is recorded in `calls` as (method, kwargs). Calls are checked
+    against the Gmail discovery document, so unknown or missing parameters
+    raise TypeError like the real client.
+    """
+
+    def __init__(self, messages=()):
+        self.mailbox = {message['id']: message for message in messages}
+        self.sent_message = {'id': 'sent123', 'threadId': 'thread123', 'labelIds': ['SENT']}
+        self.batch_error = None
+        self.batches = []
+        self.calls = []
+        self._messages = FakeMessages(self)
+
+    def users(self):
+        return self
+
+    def messages(self):
+        return self._messages
+
+    def new_batch_http_request(self, callback=None):
+        batch = FakeBatch(callback, self.batch_error)
+        self.batches.append(batch)
+        return batch
+
+    def calls_to(self, method):
+        """Return the kwargs of every recorded call to `method`."""
+        return [kwargs for name, kwargs in self.calls if name == method]
+
+
+@pytest.fixture
+def fake_gmail_api(mock_gmail_message):
+    """Create a Gmail API double whose mailbox holds mock_gmail_message."""
+    return FakeGmailService([mock_gmail_message])
+
+
+class FakeGmailHttp:
+    """
+    In-process stand-in for httplib2.Http serving canned Gmail REST responses.
+
+    `routes` maps (method, path) to a JSON response body; other requests get a
+    404. Every request is recorded in `requests` as (method, path, query, body).
+    """
+
+    def __init__(self, routes):
+        self.routes = routes
+        self.requests = []
+
+    def request(self, uri, method='GET', body=None, headers=None, **kwargs):
+        url = urlsplit(uri)
+        self.requests.append((method, url.path, parse_qs(url.query), body))
+        content = self.routes.get((method, url.path))
+        if content is None:
+            return httplib2.Response({'status': '404'}), b'{"error": {"code": 404, "message": "Not Found"}}'
+        # The shared mock message is read-only, so serialize its proxies as dicts
+        return httplib2.Response({'status': '200', 'content-type': 'application/json'}), orjson.dumps(content, default=dict)
+
+
+@pytest.fixture
+def gmail_http(mock_gmail_message):
+    """Create a Gmail REST fake serving mock_gmail_message, its trash call, and sends."""
+    messages = '/gmail/v1/users/me/messages'
+    return FakeGmailHttp({
+        ('GET', messages): {'messages': [{'id': mock_gmail_message['id']}]},
+        ('GET', f"{messages}/{mock_gmail_message['id']}"): mock_gmail_message,
+        ('POST', f"{messages}/{mock_gmail_message['id']}/trash"): {'id': mock_gmail_message['id']},
+        ('POST', f'{messages}/send'): {'id': 'sent123', 'threadId': 'thread123', 'labelIds': ['SENT']},
+    })
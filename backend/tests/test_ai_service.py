@@ -1,9 +1,15 @@
 """Tests for AI service."""
 import pytest
-from unittest.mock import Mock, patch, AsyncMock, MagicMock
+from types import SimpleNamespace
+from unittest.mock import Mock, patch, AsyncMock
 import json
 
-from backend.services.ai_service import AIService
+from backend.services.ai_service import AIService, _parse_json
+
+
+def chat_completion(content):
+    """Build a chat completion response carrying `content` as its only choice."""
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
 
 
 @pytest.fixture
@@ -34,14 +40,10 @@ class TestAIService:
         assert ai_service.client is not None
         assert ai_service.model == "gpt-4o-mini"
 
-    @pytest.mark.asyncio
     async def test_summarize_email(self, ai_service, mock_email):
         """Test email summarization."""
         with patch.object(ai_service.client.chat.completions, 'create', new_callable=AsyncMock) as mock_create:
-            mock_response = MagicMock()
-            mock_response.choices = [MagicMock()]
-            mock_response.choices[0].message.content = "Project update: Phase 1 complete, moving to phase 2."
-            mock_create.return_value = mock_response
+            mock_create.return_value = chat_completion("Project update: Phase 1 complete, moving to phase 2.")
 
             summary = await ai_service.summarize_email(
                 mock_email['body'],
@@ -53,14 +55,10 @@ class TestAIService:
             assert "phase" in summary.lower() or "project" in summary.lower()
             mock_create.assert_called_once()
 
-    @pytest.mark.asyncio
     async def test_generate_reply(self, ai_service, mock_email):
         """Test reply generation."""
         with patch.object(ai_service.client.chat.completions, 'create', new_callable=AsyncMock) as mock_create:
-            mock_response = MagicMock()
-            mock_response.choices = [MagicMock()]
-            mock_response.choices[0].message.content = "Thank you for the update, John. Looking forward to phase 2."
-            mock_create.return_value = mock_response
+            mock_create.return_value = chat_completion("Thank you for the update, John. Looking forward to phase 2.")
 
             reply = await ai_service.generate_reply(
                 mock_email['body'],
@@ -72,18 +70,14 @@ class TestAIService:
             assert len(reply) > 0
             mock_create.assert_called_once()
 
-    @pytest.mark.asyncio
     async def test_classify_intent_read_emails(self, ai_service):
         """Test intent classification for reading emails."""
         with patch.object(ai_service.client.chat.completions, 'create', new_callable=AsyncMock) as mock_create:
-            mock_response = MagicMock()
-            mock_response.choices = [MagicMock()]
-            mock_response.choices[0].message.content = json.dumps({
+            mock_create.return_value = chat_completion(json.dumps({
                 "intent": "READ_EMAILS",
                 "parameters": {"limit": 5},
                 "confidence": 0.9
-            })
-            mock_create.return_value = mock_response
+            }))
 
             result = await ai_service.classify_intent("Show me my last 5 emails")
 
@@ -91,25 +85,20 @@ class TestAIService:
             assert result['parameters']['limit'] == 5
             assert result['confidence'] > 0.8
 
-    @pytest.mark.asyncio
     async def test_classify_intent_categorize(self, ai_service):
         """Test intent classification for categorization."""
         with patch.object(ai_service.client.chat.completions, 'create', new_callable=AsyncMock) as mock_create:
-            mock_response = MagicMock()
-            mock_response.choices = [MagicMock()]
-            mock_response.choices[0].message.content = json.dumps({
+            mock_create.return_value = chat_completion(json.dumps({
                 "intent": "CATEGORIZE",
                 "parameters": {},
                 "confidence": 0.85
-            })
-            mock_create.return_value = mock_response
+            }))
 
             result = await ai_service.classify_intent("Give me today's email digest")
 
             assert result['intent'] == 'CATEGORIZE'
             assert result['confidence'] > 0.7
 
-    @pytest.mark.asyncio
     async def test_categorize_emails(self, ai_service):
         """Test email categorization."""
         mock_emails = [
@@ -118,13 +107,10 @@ class TestAIService:
         ]
 
         with patch.object(ai_service.client.chat.completions, 'create', new_callable=AsyncMock) as mock_create:
-            mock_response = MagicMock()
-            mock_response.choices = [MagicMock()]
-            mock_response.choices[0].message.content = json.dumps({
+            mock_create.return_value = chat_completion(json.dumps({
                 "0": ["Work", "Urgent"],
                 "1": ["Promotions"]
-            })
-            mock_create.return_value = mock_response
+            }))
 
             categories = await ai_service.categorize_emails(mock_emails)
 
@@ -132,7 +118,27 @@ class TestAIService:
             assert 'Promotions' in categories
             assert len(categories['Work']) > 0 or len(categories['Promotions']) > 0
 
-    @pytest.mark.asyncio
+    async def test_categorize_emails_with_summaries(self, ai_service):
+        """Test categorization fills in summaries from the same response."""
+        mock_emails = [
+            {'sender_name': 'Boss', 'subject': 'Quarterly Review', 'snippet': 'Meeting tomorrow'},
+            {'sender_name': 'Newsletter', 'subject': '50% Off Sale', 'snippet': 'Limited time offer'},
+        ]
+
+        with patch.object(ai_service.provider, 'generate_text', new_callable=AsyncMock) as mock_generate:
+            mock_generate.return_value = json.dumps({
+                "0": {"categories": ["Work", "Urgent"], "summary": "Review meeting tomorrow."},
+                "1": {"categories": ["Promotions"], "summary": "A limited time sale."}
+            })
+
+            categories = await ai_service.categorize_emails(mock_emails)
+
+            assert categories['Work'] == [mock_emails[0]]
+            assert categories['Promotions'] == [mock_emails[1]]
+            assert mock_emails[0]['ai_summary'] == "Review meeting tomorrow."
+            assert mock_emails[1]['ai_summary'] == "A limited time sale."
+            mock_generate.assert_called_once()
+
     async def test_generate_daily_digest(self, ai_service):
         """Test daily digest generation."""
         mock_emails = [
@@ -141,10 +147,7 @@ class TestAIService:
         ]
 
         with patch.object(ai_service.client.chat.completions, 'create', new_callable=AsyncMock) as mock_create:
-            mock_response = MagicMock()
-            mock_response.choices = [MagicMock()]
-            mock_response.choices[0].message.content = "Daily Digest: You have a meeting tomorrow and a report to review."
-            mock_create.return_value = mock_response
+            mock_create.return_value = chat_completion("Daily Digest: You have a meeting tomorrow and a report to review.")
 
             digest = await ai_service.generate_daily_digest(mock_emails)
 
@@ -152,7 +155,6 @@ class TestAIService:
             assert len(digest) > 0
             mock_create.assert_called_once()
 
-    @pytest.mark.asyncio
     async def test_error_handling(self, ai_service):
         """Test error handling in AI service."""
         with patch.object(ai_service.client.chat.completions, 'create', new_callable=AsyncMock) as mock_create:
@@ -161,3 +163,166 @@ class TestAIService:
             summary = await ai_service.summarize_email("Test content", "Test subject")
 
             assert "Unable to generate" in summary
+
+    async def test_summarize_emails_batch(self, ai_service):
+        """Test summarizing several emails with one provider call."""
+        with patch.object(ai_service.provider, 'generate_text', new_callable=AsyncMock) as mock_generate:
+            mock_generate.return_value = json.dumps({
+                "0": "Phase 1 is complete.",
+                "1": "Lunch moved to Friday."
+            })
+
+            summaries = await ai_service.summarize_emails([
+                ("Project Update", "We have completed phase 1."),
+                ("Lunch", "Lunch is moved to Friday."),
+            ])
+
+            assert summaries == ["Phase 1 is complete.", "Lunch moved to Friday."]
+            mock_generate.assert_called_once()
+
+    async def test_summarize_emails_batch_partial(self, ai_service):
+        """Test emails missing from the batch response are summarized individually."""
+        with patch.object(ai_service.provider, 'generate_text', new_callable=AsyncMock) as mock_generate:
+            mock_generate.side_effect = [
+                json.dumps({"0": "Phase 1 is complete."}),
+                "Lunch moved to Friday.",
+            ]
+
+            summaries = await ai_service.summarize_emails([
+                ("Project Update", "We have completed phase 1."),
+                ("Lunch", "Lunch is moved to Friday."),
+            ])
+
+            assert summaries == ["Phase 1 is complete.", "Lunch moved to Friday."]
+            assert mock_generate.call_count == 2
+
+    async def test_summarize_emails_batch_invalid(self, ai_service):
+        """Test non-text batch summaries are summarized individually instead of cached."""
+        with patch.object(ai_service.provider, 'generate_text', new_callable=AsyncMock) as mock_generate:
+            mock_generate.side_effect = [
+                json.dumps({"0": {"summary": "Phase 1"}, "1": "   "}),
+                "Phase 1 is complete.",
+                "Lunch moved to Friday.",
+            ]
+
+            summaries = await ai_service.summarize_emails([
+                ("Project Update", "We have completed phase 1."),
+                ("Lunch", "Lunch is moved to Friday."),
+            ])
+
+            assert summaries == ["Phase 1 is complete.", "Lunch moved to Friday."]
+            assert mock_generate.call_count == 3
+
+    async def test_summarize_emails_batch_chunked(self, ai_service):
+        """Test large batches are split into one provider call per chunk."""
+        with patch.object(ai_service.provider, 'generate_text', new_callable=AsyncMock) as mock_generate:
+            mock_generate.side_effect = [
+                json.dumps({str(i): f"Summary {i}" for i in range(8)}),
+                json.dumps({str(i): f"Summary {i}" for i in range(8, 10)}),
+            ]
+
+            summaries = await ai_service.summarize_emails([(f"Subject {i}", f"Body {i}") for i in range(10)])
+
+            assert summaries == [f"Summary {i}" for i in range(10)]
+            assert mock_generate.call_count == 2
+
+    async def test_summarize_emails_batch_error(self, ai_service):
+        """Test batch summarization falls back when the provider fails."""
+        with patch.object(ai_service.provider, 'generate_text', new_callable=AsyncMock) as mock_generate:
+            mock_generate.side_effect = Exception("API Error")
+
+            summaries = await ai_service.summarize_emails([("Subject", "Body")])
+
+            assert summaries == ["Summary unavailable (AI service busy)"]
+
+    async def test_summarize_email_cached(self, ai_service, mock_email):
+        """Test repeated summaries of the same email are served from cache."""
+        with patch.object(ai_service.provider, 'generate_text', new_callable=AsyncMock) as mock_generate:
+            mock_generate.return_value = "Phase 1 is complete."
+
+            first = await ai_service.summarize_email(mock_email['body'], mock_email['subject'])
+            batch = await ai_service.summarize_emails([(mock_email['subject'], mock_email['body'])])
+
+            assert first == "Phase 1 is complete."
+            assert batch == ["Phase 1 is complete."]
+            mock_generate.assert_called_once()
+
+    async def test_classify_intent_cached(self, ai_service):
+        """Test repeated chat commands reuse the cached intent."""
+        with patch.object(ai_service.provider, 'generate_text', new_callable=AsyncMock) as mock_generate:
+            mock_generate.return_value = json.dumps({
+                "intent": "GENERATE_REPLY",
+                "parameters": {"email_index": 1},
+                "confidence": 0.9
+            })
+
+            first = await ai_service.classify_intent("Reply to the first one")
+            second = await ai_service.classify_intent("  reply to the FIRST one ")
+
+            assert first == second
+            assert second['intent'] == 'GENERATE_REPLY'
+            mock_generate.assert_called_once()
+
+    async def test_classify_intent_fast_path(self, ai_service):
+        """Test plain commands are classified without calling the provider."""
+        with patch.object(ai_service.provider, 'generate_text', new_callable=AsyncMock) as mock_generate:
+            read = await ai_service.classify_intent("Show me my last 10 emails")
+            digest = await ai_service.classify_intent("Give me today's email digest")
+
+            assert read['intent'] == 'READ_EMAILS'
+            assert read['parameters']['limit'] == 10
+            assert digest['intent'] == 'CATEGORIZE'
+            mock_generate.assert_not_called()
+
+    @pytest.mark.parametrize('message, limit', [
+        ("Show me 999 emails", 50),
+        ("Read my inbox", None),
+        ("Show me the 3 newest emails", 3),
+        ("show me my 3 latest emails", 3),
+        ("Get my 5 most recent emails", 5),
+    ])
+    def test_match_intent_limit(self, message, limit):
+        """Test counts before the noun or recency words are limits, capped for the fast path."""
+        assert AIService._match_intent(message)['parameters']['limit'] == limit
+
+    @pytest.mark.parametrize('message', [
+        "show me 10 unread emails",
+        "What is an email?",
+        "How many emails do I have",
+        "is my inbox empty",
+        "I love emails",
+    ])
+    def test_match_intent_defers(self, message):
+        """Test questions, stray numbers and messages without a read verb go to the provider."""
+        assert AIService._match_intent(message) is None
+
+    @pytest.mark.parametrize('message', [
+        "show emails in the last 3 days",
+        "summarize my inbox for the past 30 days",
+        "show my emails since 2 weeks ago",
+        "show me emails in the last 2 hours",
+        "show my inbox for the last 2 weekends",
+    ])
+    def test_match_intent_time_window(self, message):
+        """Test time-window phrases are left to the provider instead of read as counts."""
+        assert AIService._match_intent(message) is None
+
+    async def test_classify_intent_ambiguous_uses_provider(self, ai_service):
+        """Test compound commands still go to the provider."""
+        with patch.object(ai_service.provider, 'generate_text', new_callable=AsyncMock) as mock_generate:
+            mock_generate.return_value = json.dumps({
+                "intent": "DELETE_EMAIL",
+                "parameters": {"sender": "John"},
+                "confidence": 0.9
+            })
+
+            result = await ai_service.classify_intent("Delete the email from John")
+
+            assert result['intent'] == 'DELETE_EMAIL'
+            mock_generate.assert_called_once()
+
+    def test_parse_json_code_block(self):
+        """Test JSON responses are parsed with or without a markdown code block."""
+        assert _parse_json('{"0": "a"}') == {"0": "a"}
+        assert _parse_json('```json\n{"0": "a"}\n```') == {"0": "a"}
+        assert _parse_json('```\n{"0": "a"}```\n') == {"0": "a"}
@@ -1,16 +1,18 @@
 """Tests for authentication service."""
 import pytest
-from unittest.mock import Mock, patch, MagicMock
-from datetime import datetime, timedelta
+from unittest.mock import Mock, patch
+from datetime import datetime, timedelta, timezone
+import asyncio
 import jwt
+from google.oauth2.credentials import Credentials
 
 from backend.services.auth_service import AuthService
 from backend.config import settings
 
 
-@pytest.fixture
+@pytest.fixture(scope="module")
 def auth_service():
-    """Create AuthService instance for testing."""
+    """Create one AuthService for the module; no test depends on its caches starting empty."""
     return AuthService()
 
 
@@ -24,7 +26,7 @@ def mock_user_data():
         "client_id": "mock_client_id",
         "client_secret": "mock_client_secret",
         "scopes": ["https://mail.google.com/"],
-        "expiry": (datetime.utcnow() + timedelta(hours=1)).isoformat(),
+        "expiry": (datetime.now(timezone.utc) + timedelta(hours=1)).isoformat(),
         "user_info": {
             "email": "test@example.com",
             "name": "Test User",
@@ -43,20 +45,23 @@ class TestAuthService:
         assert auth_service.client_config is not None
         assert "web" in auth_service.client_config
 
-    def test_get_authorization_url(self, auth_service):
-        """Test generation of authorization URL."""
+    def test_get_authorization_url(self):
+        """Test generation of authorization URL reuses one flow."""
         with patch('backend.services.auth_service.Flow') as mock_flow:
-            mock_flow_instance = MagicMock()
+            mock_flow_instance = Mock(spec_set=['authorization_url', 'code_verifier'])
             mock_flow.from_client_config.return_value = mock_flow_instance
             mock_flow_instance.authorization_url.return_value = (
                 "https://accounts.google.com/o/oauth2/auth?...",
                 "state"
             )
 
+            auth_service = AuthService()
             url = auth_service.get_authorization_url()
+            auth_service.get_authorization_url(state="csrf")
 
             assert url.startswith("https://accounts.google.com")
             mock_flow.from_client_config.assert_called_once()
+            assert mock_flow_instance.authorization_url.call_args.kwargs['state'] == "csrf"
 
     def test_create_jwt_token(self, auth_service, mock_user_data):
         """Test JWT token creation."""
@@ -95,8 +100,8 @@ class TestAuthService:
         payload = {
             "user_info": mock_user_data["user_info"],
             "credentials": {},
-            "exp": datetime.utcnow() - timedelta(hours=1),  # Expired
-            "iat": datetime.utcnow() - timedelta(hours=2)
+            "exp": datetime.now(timezone.utc) - timedelta(hours=1),  # Expired
+            "iat": datetime.now(timezone.utc) - timedelta(hours=2)
         }
 
         expired_token = jwt.encode(
@@ -117,7 +122,7 @@ class TestAuthService:
             "client_id": "mock_id",
             "client_secret": "mock_secret",
             "scopes": ["https://mail.google.com/"],
-            "expiry": datetime.utcnow().isoformat()
+            "expiry": datetime.now(timezone.utc).isoformat()
         }
 
         credentials = auth_service.get_credentials_from_token_data(credentials_data)
@@ -125,3 +130,89 @@ class TestAuthService:
         assert credentials is not None
         assert credentials.token == "mock_token"
         assert credentials.refresh_token == "mock_refresh"
+        assert credentials.expiry.tzinfo is None
+
+    def test_get_credentials_from_epoch_expiry(self, auth_service):
+        """Test expiry stored as epoch seconds is restored as naive UTC."""
+        expiry = datetime(2030, 1, 1, 12, 0, 0)
+        credentials = auth_service.get_credentials_from_token_data({
+            "access_token": "epoch_token",
+            "refresh_token": "epoch_refresh",
+            "expiry": int(expiry.replace(tzinfo=timezone.utc).timestamp())
+        })
+
+        assert credentials.expiry == expiry
+
+    def test_get_credentials_from_token_data_cached(self, auth_service):
+        """Test credentials for the same refresh token are reused."""
+        credentials_data = {
+            "access_token": "mock_token",
+            "refresh_token": "mock_refresh",
+            "token_uri": "https://oauth2.googleapis.com/token",
+            "client_id": "mock_id",
+            "client_secret": "mock_secret"
+        }
+
+        first = auth_service.get_credentials_from_token_data(credentials_data)
+        second = auth_service.get_credentials_from_token_data(dict(credentials_data, access_token="stale_token"))
+        other = auth_service.get_credentials_from_token_data(dict(credentials_data, refresh_token="other_refresh"))
+
+        assert second is first
+        assert other is not first
+
+    async def test_get_fresh_credentials(self, auth_service, make_credentials):
+        """Test tokens are only refreshed near or past expiry."""
+        def expiring_credentials(expires_in):
+            return make_credentials(expiry=(datetime.now(timezone.utc) + expires_in).replace(tzinfo=None))
+
+        with patch.object(Credentials, 'refresh') as mock_refresh:
+            fresh = expiring_credentials(timedelta(hours=1))
+            assert await auth_service.get_fresh_credentials(fresh) is fresh
+            mock_refresh.assert_not_called()
+
+            # Expired tokens wait for the refresh
+            expired = expiring_credentials(timedelta(minutes=-1))
+            await auth_service.get_fresh_credentials(expired)
+            mock_refresh.assert_called_once()
+
+            # Tokens about to expire are refreshed in the background
+            stale = expiring_credentials(timedelta(minutes=2))
+            await auth_service.get_fresh_credentials(stale)
+            await asyncio.gather(*auth_service._refresh_tasks.values())
+            assert mock_refresh.call_count == 2
+
+    def test_create_jwt_token_trimmed(self, auth_service, mock_user_data):
+        """Test the JWT carries only the user's tokens and credentials are rebuilt from settings."""
+        token = auth_service.create_jwt_token(mock_user_data)
+        credentials_data = auth_service.verify_jwt_token(token)["credentials"]
+
+        assert set(credentials_data) == {"access_token", "refresh_token", "expiry"}
+
+        credentials = auth_service.get_credentials_from_token_data(credentials_data)
+        assert credentials.client_id == settings.GOOGLE_CLIENT_ID
+        assert credentials.client_secret == settings.GOOGLE_CLIENT_SECRET
+        assert credentials.token_uri == "https://oauth2.googleapis.com/token"
+
+    def test_user_info_from_id_token(self, auth_service):
+        """Test the user's profile is read from the ID token for this client only."""
+        claims = {
+            "iss": "https://accounts.google.com",
+            "aud": settings.GOOGLE_CLIENT_ID,
+            "sub": "12345",
+            "email": "test@example.com",
+            "name": "Test User",
+            "picture": "https://example.com/pic.jpg",
+            "exp": datetime.now(timezone.utc) + timedelta(hours=1)
+        }
+        id_token = jwt.encode(claims, "google-signing-key-for-tests-only-1234", algorithm="HS256")
+
+        assert auth_service._user_info_from_id_token(id_token) == {
+            "email": "test@example.com",
+            "name": "Test User",
+            "picture": "https://example.com/pic.jpg",
+            "id": "12345"
+        }
+
+        other_client = jwt.encode({**claims, "aud": "other-client"}, "google-signing-key-for-tests-only-1234", algorithm="HS256")
+        assert auth_service._user_info_from_id_token(other_client) is None
+        assert auth_service._user_info_from_id_token(None) is None
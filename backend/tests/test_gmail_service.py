@@ -1,129 +1,263 @@
 """Tests for Gmail service."""
+import email
+import email.policy
 import pytest
-from unittest.mock import Mock, patch, MagicMock
-from google.oauth2.credentials import Credentials
+from types import SimpleNamespace
+from unittest.mock import patch
+import orjson
+from googleapiclient.discovery import build_from_document
+from googleapiclient.errors import HttpError
 
-from backend.services.gmail_service import GmailService
+from backend.services.gmail_service import FULL_FIELDS, GmailService, OrjsonModel
+
+
+@pytest.fixture(autouse=True, scope="module")
+def patched_build():
+    """Patch the Gmail client builder once for the module; tests opt into the real client via gmail_service_http."""
+    with patch('backend.services.gmail_service.build_from_document', autospec=True) as mock_build:
+        yield mock_build
+
+
+@pytest.fixture
+def mock_build(patched_build, fake_gmail_api):
+    """The patched Gmail client builder, reset to wrap this test's Gmail API double."""
+    patched_build.reset_mock()
+    patched_build.return_value = fake_gmail_api
+    return patched_build
+
+
+async def run_inline(func, /, *args, **kwargs):
+    """Stand-in for asyncio.to_thread that calls `func` on the event loop thread."""
+    return func(*args, **kwargs)
 
 
 @pytest.fixture
-def mock_credentials():
-    """Create mock Google credentials."""
-    return Credentials(
-        token="mock_token",
-        refresh_token="mock_refresh",
-        token_uri="https://oauth2.googleapis.com/token",
-        client_id="mock_id",
-        client_secret="mock_secret"
-    )
+def inline_threads():
+    """Run gmail_service's worker-thread calls inline; the Gmail API double never blocks."""
+    with patch('backend.services.gmail_service.to_thread', run_inline):
+        yield
 
 
 @pytest.fixture
-def mock_gmail_message():
-    """Create mock Gmail message."""
-    return {
-        'id': 'msg123',
-        'threadId': 'thread123',
-        'snippet': 'This is a test email snippet',
-        'payload': {
-            'headers': [
-                {'name': 'Subject', 'value': 'Test Subject'},
-                {'name': 'From', 'value': 'John Doe <john@example.com>'},
-                {'name': 'To', 'value': 'test@example.com'},
-                {'name': 'Date', 'value': 'Mon, 1 Jan 2024 12:00:00 +0000'},
-                {'name': 'Message-ID', 'value': '<msg123@example.com>'}
-            ],
-            'body': {
-                'data': 'VGhpcyBpcyB0ZXN0IGVtYWlsIGJvZHk='  # Base64 encoded "This is test email body"
-            }
-        },
-        'labelIds': ['INBOX', 'UNREAD']
+def gmail_service(mock_build, mock_credentials, inline_threads):
+    """Create a GmailService on the Gmail API double; it caches messages, so each test gets its own."""
+    return GmailService(mock_credentials)
+
+
+@pytest.fixture
+def mailbox_ids(request, fake_gmail_api, mock_gmail_message):
+    """Fill the Gmail API double with `request.param` copies of mock_gmail_message and return their IDs."""
+    message_ids = [f'msg{i}' for i in range(request.param)]
+    fake_gmail_api.mailbox = {
+        message_id: dict(mock_gmail_message, id=message_id) for message_id in message_ids
     }
+    return message_ids
+
+
+@pytest.fixture
+def gmail_service_http(patched_build, gmail_http, make_credentials):
+    """Create a GmailService on the real API client and real credentials, sending requests to the Gmail REST fake."""
+    patched_build.side_effect = build_from_document
+    try:
+        with patch.object(GmailService, '_thread_http', return_value=gmail_http):
+            yield GmailService(make_credentials())
+    finally:
+        patched_build.side_effect = None
 
 
 class TestGmailService:
     """Test cases for GmailService."""
 
-    @patch('backend.services.gmail_service.build')
-    def test_initialization(self, mock_build, mock_credentials):
+    def test_initialization(self, gmail_service, mock_build, mock_credentials):
         """Test GmailService initialization."""
-        gmail_service = GmailService(mock_credentials)
-
         assert gmail_service is not None
         assert gmail_service.credentials == mock_credentials
-        mock_build.assert_called_once_with('gmail', 'v1', credentials=mock_credentials)
-
-    @patch('backend.services.gmail_service.build')
-    @pytest.mark.asyncio
-    async def test_fetch_emails(self, mock_build, mock_credentials, mock_gmail_message):
-        """Test fetching emails."""
-        # Setup mocks
-        mock_service = MagicMock()
-        mock_build.return_value = mock_service
-
-        mock_service.users().messages().list().execute.return_value = {
-            'messages': [{'id': 'msg123'}]
+        mock_build.assert_called_once()
+        assert mock_build.call_args.args[0]['name'] == 'gmail'
+        build_kwargs = mock_build.call_args.kwargs
+        assert isinstance(build_kwargs.pop('model'), OrjsonModel)
+        assert build_kwargs == {
+            'credentials': mock_credentials,
+            'requestBuilder': gmail_service._build_request
         }
-        mock_service.users().messages().get().execute.return_value = mock_gmail_message
 
-        gmail_service = GmailService(mock_credentials)
+    async def test_fetch_emails(self, gmail_service):
+        """Test fetching emails."""
         emails = await gmail_service.fetch_emails(max_results=5)
 
+        expected = {
+            'id': 'msg123',
+            'subject': 'Test Subject',
+            'sender_email': 'john@example.com',
+            'sender_name': 'John Doe'
+        }
         assert len(emails) == 1
-        assert emails[0]['id'] == 'msg123'
-        assert emails[0]['subject'] == 'Test Subject'
-        assert emails[0]['sender_email'] == 'john@example.com'
-        assert emails[0]['sender_name'] == 'John Doe'
+        assert {key: emails[0][key] for key in expected} == expected
 
-    @patch('backend.services.gmail_service.build')
-    def test_parse_email_address(self, mock_build, mock_credentials):
+    @pytest.mark.parametrize('raw, expected_name, expected_email', [
+        ('John Doe <john@example.com>', 'John Doe', 'john@example.com'),
+        ('john@example.com', 'john@example.com', 'john@example.com'),
+        ('"Doe, John" <john@example.com>', 'Doe, John', 'john@example.com'),
+        ('<john@example.com>', '', 'john@example.com'),
+        ('John Doe <john@example.com', 'John Doe <john@example.com', 'John Doe <john@example.com'),
+    ])
+    def test_parse_email_address(self, gmail_service, raw, expected_name, expected_email):
         """Test email address parsing."""
-        gmail_service = GmailService(mock_credentials)
-
-        # Test with name and email
-        name, email = gmail_service._parse_email_address('John Doe <john@example.com>')
-        assert name == 'John Doe'
-        assert email == 'john@example.com'
-
-        # Test with email only
-        name, email = gmail_service._parse_email_address('john@example.com')
-        assert name == 'john@example.com'
-        assert email == 'john@example.com'
+        assert gmail_service._parse_email_address(raw) == (expected_name, expected_email)
 
-    @patch('backend.services.gmail_service.build')
-    @pytest.mark.asyncio
-    async def test_send_email(self, mock_build, mock_credentials):
+    async def test_send_email(self, gmail_service, fake_gmail_api):
         """Test sending email."""
-        mock_service = MagicMock()
-        mock_build.return_value = mock_service
-
-        mock_service.users().messages().send().execute.return_value = {
-            'id': 'sent123',
-            'threadId': 'thread123',
-            'labelIds': ['SENT']
-        }
-
-        gmail_service = GmailService(mock_credentials)
         result = await gmail_service.send_email(
             to='recipient@example.com',
             subject='Test Subject',
             body='Test body'
         )
 
-        assert result['id'] == 'sent123'
-        assert result['thread_id'] == 'thread123'
+        assert result == {'id': 'sent123', 'thread_id': 'thread123', 'label_ids': ['SENT']}
+        assert 'raw' in fake_gmail_api.calls_to('send')[0]['body']
 
-    @patch('backend.services.gmail_service.build')
-    @pytest.mark.asyncio
-    async def test_delete_email(self, mock_build, mock_credentials):
-        """Test deleting email."""
-        mock_service = MagicMock()
-        mock_build.return_value = mock_service
+    @pytest.mark.parametrize('subject', ['Re: Project Update', 'Re: Café meeting'])
+    def test_build_message(self, subject):
+        """Test sent messages parse back to the same headers and body."""
+        raw = GmailService._build_message('recipient@example.com', subject, 'Hi John,\nThanks — see you then.')
+        message = email.message_from_bytes(raw, policy=email.policy.default)
 
-        mock_service.users().messages().trash().execute.return_value = {}
+        assert message['To'] == 'recipient@example.com'
+        assert message['Subject'] == subject
+        assert message.get_content().replace('\r\n', '\n').rstrip('\n') == 'Hi John,\nThanks — see you then.'
 
-        gmail_service = GmailService(mock_credentials)
+    async def test_delete_email(self, gmail_service, fake_gmail_api):
+        """Test deleting email."""
         result = await gmail_service.delete_email('msg123')
 
         assert result is True
-        mock_service.users().messages().trash.assert_called_once()
+        assert fake_gmail_api.calls_to('trash') == [{'userId': 'me', 'id': 'msg123'}]
+
+    async def test_get_email_by_id(self, gmail_service, fake_gmail_api, mock_body):
+        """Test fetching a single email by ID."""
+        email = await gmail_service.get_email_by_id('msg123')
+
+        assert email['id'] == 'msg123'
+        assert email['body'] == mock_body
+        assert fake_gmail_api.calls_to('get') == [
+            {'userId': 'me', 'id': 'msg123', 'format': 'full', 'fields': FULL_FIELDS}
+        ]
+
+    @pytest.mark.parametrize('fetch', [
+        lambda service: service.fetch_emails(max_results=5),
+        lambda service: service.fetch_emails_with_query('from:john@example.com', max_results=1),
+    ], ids=['list', 'query'])
+    async def test_fetch_emails_light(self, gmail_service, fake_gmail_api, fetch):
+        """Test list and query fetches request metadata only by default."""
+        emails = await fetch(gmail_service)
+
+        get_kwargs = fake_gmail_api.calls_to('get')[0]
+        assert get_kwargs['format'] == 'metadata'
+        assert 'payload/headers' in get_kwargs['fields']
+        assert 'Message-ID' in get_kwargs['metadataHeaders']
+        assert emails[0]['sender_email'] == 'john@example.com'
+
+    async def test_fetch_emails_batch_fallback(self, gmail_service, fake_gmail_api):
+        """Test messages are fetched individually when the batch request fails."""
+        fake_gmail_api.batch_error = HttpError(SimpleNamespace(status=500, reason='Internal Server Error'), b'Batch failed')
+
+        emails = await gmail_service.fetch_emails(max_results=5)
+
+        assert len(emails) == 1
+        assert emails[0]['id'] == 'msg123'
+        assert len(fake_gmail_api.calls_to('get')) == 2
+
+    def test_clean_body(self, gmail_service):
+        """Test quoted replies are dropped and long bodies are capped."""
+        body = "Sounds good.\n\nOn Mon, 1 Jan 2024 at 12:00, John Doe <john@example.com> wrote:\n> Are we on?"
+        assert gmail_service._clean_body(body) == 'Sounds good.'
+        assert gmail_service._clean_body("Hello\n> quoted\nThanks") == "Hello\n> quoted\nThanks"
+        assert gmail_service._clean_body("Thanks\n\n> Are we on?\n>\n> John") == 'Thanks'
+        assert len(gmail_service._clean_body('x' * 10000)) == 4000
+
+    @pytest.mark.parametrize('mailbox_ids', [2], indirect=True)
+    async def test_fetch_emails_batch_order(self, gmail_service, mailbox_ids):
+        """Test batched messages come back in list order."""
+        emails = await gmail_service.fetch_emails(max_results=5)
+
+        assert [email['id'] for email in emails] == mailbox_ids
+
+    @pytest.mark.parametrize('mailbox_ids, batch_count', [(100, 1), (150, 2)], indirect=['mailbox_ids'])
+    async def test_get_messages_chunked(self, gmail_service, fake_gmail_api, mailbox_ids, batch_count):
+        """Test messages are split into batches of at most 100 and keep their order."""
+        emails = await gmail_service._get_messages(mailbox_ids, format='full')
+
+        assert [email['id'] for email in emails] == mailbox_ids
+        assert len(fake_gmail_api.batches) == batch_count
+
+    def test_connections_shared_per_thread(self, mock_build, mock_credentials):
+        """Test services on the same thread reuse one HTTP connection pool."""
+        first = GmailService(mock_credentials)
+        second = GmailService(mock_credentials)
+
+        first_request = first._build_request(None, None, 'https://example.com', method='GET')
+        second_request = second._build_request(None, None, 'https://example.com', method='GET')
+
+        assert first_request.http is not second_request.http
+        assert first_request.http.http is second_request.http.http
+
+    def test_extract_body_prefers_plain_text(self, gmail_service):
+        """Test nested text/plain parts win over earlier text/html parts."""
+        payload = {
+            'mimeType': 'multipart/mixed',
+            'parts': [
+                {'mimeType': 'text/html', 'body': {'data': 'PHA-SFRNTDwvcD4='}},  # <p>HTML</p>
+                {'mimeType': 'multipart/alternative', 'parts': [
+                    {'mimeType': 'text/plain', 'body': {'data': 'UGxhaW4='}},  # Plain
+                ]},
+            ]
+        }
+        assert gmail_service._extract_body(payload) == 'Plain'
+
+        payload['parts'].pop()
+        assert gmail_service._extract_body(payload) == '<p>HTML</p>'
+        assert gmail_service._extract_body({'mimeType': 'multipart/mixed'}) == ''
+        # Unpadded base64url data
+        assert gmail_service._extract_body({'body': {'data': 'UGxhaW4'}}) == 'Plain'
+
+    def test_orjson_model_deserialize(self):
+        """Test API responses are parsed from bytes and invalid bodies raise."""
+        model = OrjsonModel()
+
+        assert model.deserialize(b'{"id": "msg123"}') == {'id': 'msg123'}
+        assert model.deserialize(b'') == {}
+        with pytest.raises(ValueError):
+            model.deserialize(b'not json')
+
+    async def test_fetch_emails_cached(self, gmail_service, fake_gmail_api):
+        """Test messages parsed recently are not fetched again."""
+        first = await gmail_service.fetch_emails(max_results=5)
+        first[0]['ai_summary'] = 'Annotated by the caller'
+        second = await gmail_service.fetch_emails(max_results=5)
+
+        assert len(fake_gmail_api.calls_to('get')) == 1
+        assert second[0]['subject'] == 'Test Subject'
+        assert 'ai_summary' not in second[0]
+
+    async def test_get_email_by_id_over_http(self, gmail_service_http, gmail_http, mock_body):
+        """Test a message fetched through the real API client is requested and parsed."""
+        email = await gmail_service_http.get_email_by_id('msg123')
+
+        assert email['body'] == mock_body
+        assert email['sender_email'] == 'john@example.com'
+        [(method, path, query, _)] = gmail_http.requests
+        assert (method, path) == ('GET', '/gmail/v1/users/me/messages/msg123')
+        assert query['format'] == ['full']
+        assert query['fields'] == [FULL_FIELDS]
+
+    async def test_send_and_delete_email_over_http(self, gmail_service_http, gmail_http):
+        """Test sends and deletes through the real API client hit the Gmail REST endpoints."""
+        result = await gmail_service_http.send_email('recipient@example.com', 'Test Subject', 'Test body')
+        deleted = await gmail_service_http.delete_email('msg123')
+
+        assert result == {'id': 'sent123', 'thread_id': 'thread123', 'label_ids': ['SENT']}
+        assert deleted is True
+        (send_method, send_path, _, send_body), (trash_method, trash_path, _, _) = gmail_http.requests
+        assert (send_method, send_path) == ('POST', '/gmail/v1/users/me/messages/send')
+        assert 'raw' in orjson.loads(send_body)
+        assert (trash_method, trash_path) == ('POST', '/gmail/v1/users/me/messages/msg123/trash')
@@ -0,0 +1,127 @@
+"""Tests for API endpoints."""
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, Mock, patch
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from backend import main
+
+
+@pytest.fixture
+def user_data():
+    """Verified JWT payload of the signed-in user."""
+    return {"user_info": {"email": "test@example.com"}, "credentials": {"access_token": "mock_token"}}
+
+
+@pytest.fixture
+def gmail_service():
+    """Gmail service whose sends succeed."""
+    service = Mock()
+    service.send_email = AsyncMock(return_value={'id': 'sent123', 'thread_id': 'thread123', 'label_ids': ['SENT']})
+    return service
+
+
+@pytest.fixture
+def client(user_data, gmail_service):
+    """Create a TestClient signed in as user_data, with the Gmail service mocked."""
+    with patch.object(main, 'verify_token_cached', return_value=user_data), \
+            patch.object(main, 'get_gmail_service', AsyncMock(return_value=gmail_service)):
+        yield TestClient(main.app, headers={"Authorization": "Bearer mock_jwt"})
+
+
+SEND_BODY = {"to": "recipient@example.com", "subject": "Test Subject", "body": "Test body"}
+
+
+class TestSendEmail:
+    """Test cases for queued email sending."""
+
+    def test_send_email_queued(self, client, gmail_service):
+        """Test sends return 202 at once and are delivered by the background task."""
+        response = client.post("/emails/send", json=SEND_BODY)
+
+        assert response.status_code == 202
+        body = response.json()
+        assert body["status"] == "queued"
+        gmail_service.send_email.assert_awaited_once_with(
+            to="recipient@example.com", subject="Test Subject", body="Test body", thread_id=None
+        )
+
+        status = client.get(f"/emails/send/{body['client_id']}").json()
+        assert status == {"client_id": body["client_id"], "status": "sent", "message_id": "sent123"}
+
+    def test_send_email_failure_reported(self, client, gmail_service):
+        """Test a failed background send is reported by the status lookup."""
+        gmail_service.send_email.side_effect = RuntimeError("Gmail unavailable")
+
+        client_id = client.post("/emails/send", json=SEND_BODY).json()["client_id"]
+        status = client.get(f"/emails/send/{client_id}").json()
+
+        assert status["status"] == "failed"
+        assert status["error"] == "Gmail unavailable"
+
+    def test_send_email_serverless_sends_before_responding(self, client, gmail_service):
+        """Test sends complete within the request when background sending is off."""
+        with patch.object(main.settings, 'SEND_EMAIL_IN_BACKGROUND', False):
+            response = client.post("/emails/send", json=SEND_BODY)
+
+        assert response.status_code == 200
+        assert response.json()["status"] == "sent"
+        assert response.json()["message_id"] == "sent123"
+        gmail_service.send_email.assert_awaited_once()
+
+    def test_send_status_other_user(self, client, user_data):
+        """Test send status is only visible to the user who queued the email."""
+        client_id = client.post("/emails/send", json=SEND_BODY).json()["client_id"]
+        user_data["user_info"] = {"email": "other@example.com"}
+
+        assert client.get(f"/emails/send/{client_id}").status_code == 404
+
+
+class TestGetEmails:
+    """Test cases for the email list."""
+
+    def test_get_emails_fetches_bodies(self, client, gmail_service):
+        """Test listed emails carry their bodies for the cards and summaries."""
+        gmail_service.fetch_emails = AsyncMock(return_value=[{'id': 'msg123', 'body': 'Full body'}])
+
+        with patch.object(main, 'attach_summaries', AsyncMock()) as mock_attach:
+            response = client.get("/emails?limit=3")
+
+        assert response.json() == {"emails": [{'id': 'msg123', 'body': 'Full body'}]}
+        gmail_service.fetch_emails.assert_awaited_once_with(max_results=3, light=False)
+        mock_attach.assert_awaited_once()
+
+    async def test_gmail_service_requires_access_token(self):
+        """Test sessions without an access token are rejected instead of sharing one cache entry."""
+        with pytest.raises(HTTPException) as exc_info:
+            await main.get_gmail_service({"credentials": {}})
+
+        assert exc_info.value.status_code == 401
+
+
+class TestStreamSummaries:
+    """Test cases for streamed email summaries."""
+
+    async def test_disconnect_cancels_pending_summaries(self):
+        """Test closing the stream stops chunks that are still being summarized."""
+        cancelled = asyncio.Event()
+
+        async def attach_summaries(chunk):
+            if chunk[0]['id'] == 'slow0':
+                try:
+                    await asyncio.Event().wait()
+                except asyncio.CancelledError:
+                    cancelled.set()
+                    raise
+            for email in chunk:
+                email['ai_summary'] = 'Summary'
+
+        emails = [{'id': f'fast{i}'} for i in range(main.BATCH_SIZE)] + [{'id': 'slow0'}]
+        with patch.object(main, 'attach_summaries', attach_summaries):
+            stream = main.stream_summaries(emails)
+            assert (await stream.__anext__()).startswith(b"event: emails")
+            assert (await stream.__anext__()).startswith(b"event: summary")
+            await stream.aclose()
+
+        await asyncio.wait_for(cancelled.wait(), timeout=1)
@@ -21,6 +21,13 @@ import {
   AlertCircle,
 } from 'lucide-react';
 
+// Emails loaded into the dashboard when it opens
+const INBOX_PREVIEW_LIMIT = 5;
+
+// How often and how long to poll a queued send for its outcome
+const SEND_STATUS_POLL_MS = 1500;
+const SEND_STATUS_MAX_POLLS = 20;
+
 interface UserInfo {
   email: string;
   name: string;
@@ -45,6 +52,8 @@ function DashboardContent() {
   const searchParams = useSearchParams();
   const { toast } = useToast();
   const messagesEndRef = useRef<HTMLDivElement>(null);
+  // Bumped whenever the email list is replaced, so a slower inbox stream can't overwrite it
+  const emailsVersion = useRef(0);
 
   const [userInfo, setUserInfo] = useState<UserInfo | null>(null);
   const [messages, setMessages] = useState<Message[]>([]);
@@ -91,6 +100,7 @@ I'm your AI email assistant. Here's what I can help you with:
 Just type your request naturally, and I'll take care of it!`);
 
       setIsInitializing(false);
+      loadInbox();
     } catch (error) {
       console.error('Initialization error:', error);
       toast({
@@ -112,6 +122,26 @@ Just type your request naturally, and I'll take care of it!`);
     setMessages((prev) => [...prev, newMessage]);
   };
 
+  // Show the latest emails as soon as they arrive and fill in summaries as they complete
+  const loadInbox = async () => {
+    const version = ++emailsVersion.current;
+    try {
+      await apiClient.streamEmails(
+        INBOX_PREVIEW_LIMIT,
+        (streamed) => {
+          if (emailsVersion.current !== version) return;
+          setEmails(streamed.map((email) => ({ ...email, ai_summary: 'Summarizing…' })));
+        },
+        (id, summary) => {
+          if (emailsVersion.current !== version) return;
+          setEmails((prev) => prev.map((email) => (email.id === id ? { ...email, ai_summary: summary } : email)));
+        }
+      );
+    } catch (error) {
+      console.error('Inbox load error:', error);
+    }
+  };
+
   const handleSendMessage = async () => {
     if (!inputMessage.trim() || isLoading) return;
 
@@ -125,6 +155,7 @@ Just type your request naturally, and I'll take care of it!`);
 
       // Handle different response types
       if (response.emails) {
+        emailsVersion.current++;
         setEmails(response.emails);
         setCategories(null);
         setDigest('');
@@ -132,6 +163,7 @@ Just type your request naturally, and I'll take care of it!`);
       } else if (response.categories) {
         setCategories(response.categories);
         setDigest(response.digest || '');
+        emailsVersion.current++;
         setEmails([]);
         addMessage('assistant', response.message || "Here's your categorized email overview:");
       } else {
@@ -163,21 +195,66 @@ Just type your request naturally, and I'll take care of it!`);
     }
   };
 
+  // Poll the queued send until Gmail accepts or rejects it
+  const watchSendStatus = async (clientId: string, recipient: string): Promise<void> => {
+    for (let attempt = 0; attempt < SEND_STATUS_MAX_POLLS; attempt++) {
+      await new Promise((resolve) => setTimeout(resolve, SEND_STATUS_POLL_MS));
+      try {
+        const result = await apiClient.getSendStatus(clientId);
+        if (result.status === 'sent') {
+          addMessage('assistant', `✅ Reply sent to ${recipient}!`);
+          return;
+        }
+        if (result.status === 'failed') {
+          addMessage('system', `Failed to send reply to ${recipient}: ${result.error}`);
+          toast({
+            title: 'Error',
+            description: 'Failed to send email.',
+            variant: 'destructive',
+          });
+          return;
+        }
+      } catch (error: any) {
+        // Another instance may not know the ID yet, so keep polling on 404
+        if (error.response?.status === 404) {
+          continue;
+        }
+        console.error('Send status error:', error);
+        break;
+      }
+    }
+    addMessage('system', `Could not confirm that your reply to ${recipient} was sent. Check your Sent folder.`);
+  };
+
   const handleSendReply = async (email: Email, replyText: string): Promise<void> => {
     try {
-      await apiClient.sendEmail(
+      const result = await apiClient.sendEmail(
         email.sender_email,
         `Re: ${email.subject}`,
         replyText,
         email.thread_id
       );
 
-      addMessage('assistant', `✅ Reply sent to ${email.sender_name || email.sender_email}!`);
+      const recipient = email.sender_name || email.sender_email;
+
+      // Serverless deployments send before responding
+      if (result.status === 'sent') {
+        addMessage('assistant', `✅ Reply sent to ${recipient}!`);
+        toast({
+          title: 'Success',
+          description: 'Email sent successfully.',
+        });
+        return;
+      }
+
+      addMessage('assistant', `📤 Reply to ${recipient} queued for sending.`);
 
       toast({
-        title: 'Success',
-        description: 'Email sent successfully!',
+        title: 'Queued',
+        description: 'Email queued for sending.',
       });
+
+      watchSendStatus(result.client_id, recipient);
     } catch (error: any) {
       console.error('Send error:', error);
       addMessage('system', 'Failed to send email. Please try again.');
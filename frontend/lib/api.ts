@@ -86,6 +86,45 @@ class APIClient {
     return response.data;
   }
 
+  // Streams emails first, then each AI summary as it completes.
+  // Uses fetch because EventSource can't send the Authorization header.
+  async streamEmails(
+    limit: number,
+    onEmails: (emails: any[]) => void,
+    onSummary: (id: string, summary: string) => void
+  ) {
+    const token = this.getToken();
+    const response = await fetch(`${API_URL}/emails?limit=${limit}&stream=true`, {
+      credentials: 'include',
+      headers: token ? { Authorization: `Bearer ${token}` } : {},
+    });
+    if (!response.ok || !response.body) {
+      throw new Error(`Failed to fetch emails: ${response.status}`);
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+
+    while (true) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+
+      // Events are separated by a blank line
+      const events = buffer.split('\n\n');
+      buffer = events.pop() || '';
+      for (const raw of events) {
+        const event = raw.match(/^event: (.*)$/m)?.[1];
+        const data = raw.match(/^data: (.*)$/m)?.[1];
+        if (!event || !data) continue;
+        const payload = JSON.parse(data);
+        if (event === 'emails') onEmails(payload.emails);
+        else if (event === 'summary') onSummary(payload.id, payload.summary);
+      }
+    }
+  }
+
   async generateReply(emailId: string, customContext?: string) {
     const response = await this.client.post('/emails/reply/generate', {
       email_id: emailId,
@@ -104,6 +143,11 @@ class APIClient {
     return response.data;
   }
 
+  async getSendStatus(clientId: string) {
+    const response = await this.client.get(`/emails/send/${clientId}`);
+    return response.data;
+  }
+
   async deleteEmail(emailId: string) {
     const response = await this.client.post('/emails/delete', {
       email_id: emailId,